@@ -0,0 +1,4 @@
+"""Benchmarks for the game.  Run these from the game directory, eg.:
+
+    python -m benchmarks.startup
+"""
@@ -0,0 +1,87 @@
+"""Renders a large network of pylons offscreen, drawing the pylons with the
+instance batches versus with a model per pylon, as the game used to do, and
+compares the number of Geoms and the frame time."""
+
+from panda3d import core
+
+import argparse
+import os
+import time
+
+from .wires import build_network
+
+
+main_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def count_geoms(root):
+    """Counts the Geoms that aren't hidden or empty, each of which takes at
+    least one draw call if it is in view."""
+
+    return sum(not geom.is_empty() for path in root.find_all_matches("**/+GeomNode") if not path.is_hidden()
+               for geom in path.node().get_geoms())
+
+
+def frame_time(base, frames):
+    # Get everything prepared first.
+    for i in range(3):
+        base.graphics_engine.render_frame()
+
+    start = time.perf_counter()
+    for i in range(frames):
+        base.graphics_engine.render_frame()
+    return (time.perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--size', type=int, default=16, help="width of the grid of pylons")
+    parser.add_argument('--tiny', action='store_true', help="use the software renderer")
+    args = parser.parse_args()
+
+    core.load_prc_file(core.Filename(core.Filename.from_os_specific(main_dir), "config.prc"))
+    core.load_prc_file_data("", "window-type offscreen\naudio-library-name null\nsync-video #f")
+    if args.tiny:
+        core.load_prc_file_data("", "load-display p3tinydisplay")
+
+    from direct.showbase.ShowBase import ShowBase
+    from direct.showbase.Audio3DManager import Audio3DManager
+    from gamelib.world import World
+
+    base = ShowBase()
+    world = World(Audio3DManager(base.sfxManagerList[0], base.camera))
+    world.root.reparent_to(base.render)
+    wires = build_network(world, args.size)
+    world.flush_visuals()
+
+    # Look at the whole network.
+    center = (args.size - 1) * 2.5 * 0.5
+    base.camera.set_pos(center, center - args.size * 2.5, args.size * 2.5)
+    base.camera.look_at(center, center, 0)
+
+    pylons = [pylon for pylon in world.pylons if pylon.placed]
+    print("{} pylons, {} wires, rendering with {}".format(
+        len(pylons), len(wires), base.win.gsg.get_driver_renderer()))
+
+    batched = frame_time(base, args.frames)
+    batched_geoms = count_geoms(base.render)
+
+    # Now give every pylon its own model again.
+    for batch in world.pylon_batches.values():
+        batch.path.detach_node()
+    for pylon in pylons:
+        model = loader.load_model(pylon.model.name)
+        model.reparent_to(pylon.model)
+        model.set_color_off(1)
+
+    separate = frame_time(base, args.frames)
+    separate_geoms = count_geoms(base.render)
+
+    print("{:<16} {:>8} {:>12}".format("pylons drawn", "geoms", "frame (ms)"))
+    print("{:<16} {:>8} {:>12.2f}".format("model per pylon", separate_geoms, separate * 1000))
+    print("{:<16} {:>8} {:>12.2f}".format("instance batch", batched_geoms, batched * 1000))
+
+
+if __name__ == '__main__':
+    main()
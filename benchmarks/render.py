@@ -0,0 +1,203 @@
+"""Runs the game without a window on a scripted scenario, for a fixed number of
+frames at a fixed frame rate, and reports how long each task took per frame,
+along with the time spent culling and drawing, as JSON.
+
+This doesn't need a GPU: it renders to an offscreen buffer, which works with
+a software OpenGL such as Mesa's llvmpipe, and with --window-type none it
+doesn't render at all."""
+
+from panda3d import core
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import sys
+import time
+
+
+main_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Timings(object):
+    """Collects a number of samples, in seconds, for each name."""
+
+    def __init__(self):
+        self.samples = {}
+        self.cull_time = 0.0
+
+    def add(self, name, value):
+        self.samples.setdefault(name, []).append(value)
+
+    def summary(self, frames):
+        result = {}
+        for name, samples in sorted(self.samples.items()):
+            result[name] = {
+                "calls": len(samples),
+                "total_ms": sum(samples) * 1000,
+                "mean_ms": sum(samples) * 1000 / frames,
+                "max_ms": max(samples) * 1000,
+            }
+        return result
+
+
+def time_culling(timings):
+    """Returns a display region callback that adds the time it takes to cull
+    the display region to timings.cull_time."""
+
+    def callback(cbdata):
+        start = time.perf_counter()
+        cbdata.upcall()
+        timings.cull_time += time.perf_counter() - start
+
+    return core.PythonCallbackObject(callback)
+
+
+def build_scenario(world, towns, pylons, wires):
+    """Sprouts towns until there are the given number, places a square grid of
+    pylons in the middle of the map, and connects the generator and the towns
+    to their closest pylons and the pylons to their neighbours, until there
+    are the given number of wires."""
+
+    from gamelib import constants
+
+    while len(world.towns) < towns:
+        count = len(world.towns)
+        world.sprout_town()
+        if len(world.towns) == count:
+            break
+
+    placed = []
+    if pylons > 0:
+        columns = int(math.ceil(math.sqrt(pylons)))
+        map_width = min(world.grid.shape) * constants.grid_spacing
+        spacing = min(2.5, (map_width - constants.grid_spacing) / columns)
+        offset = (columns - 1) * spacing * 0.5
+
+        for i in range(pylons):
+            y, x = divmod(i, columns)
+            pylon = world.construct_pylon()
+            pylon.position(x * spacing - offset, y * spacing - offset)
+            pylon.finish_placement()
+            placed.append(pylon)
+
+    # Which pairs to connect, in order.
+    pairs = []
+    for node in [world.gen] + world.towns:
+        if placed:
+            closest = min(placed, key=lambda pylon: (pylon.x - node.x) ** 2 + (pylon.y - node.y) ** 2)
+            pairs.append((node, closest))
+
+    for i, pylon in enumerate(placed):
+        y, x = divmod(i, columns)
+        if x + 1 < columns and i + 1 < len(placed):
+            pairs.append((pylon, placed[i + 1]))
+        if i + columns < len(placed):
+            pairs.append((pylon, placed[i + columns]))
+
+    for origin, target in pairs[:wires]:
+        wire = origin.connect_to(target)
+        wire.finish_placement()
+
+    for pylon in placed:
+        pylon.on_update()
+
+    # The pylons that were left without wires are gone by now.
+    return len([pylon for pylon in placed if not pylon.stashed]), min(len(pairs), wires)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--fps', type=float, default=60.0, help="frame rate to advance the clock by")
+    parser.add_argument('--towns', type=int, default=6)
+    parser.add_argument('--pylons', type=int, default=64)
+    parser.add_argument('--wires', type=int, default=120)
+    parser.add_argument('--speed', type=float, default=1.0, help="game speed")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--window-type', choices=('offscreen', 'none'), default='offscreen')
+    parser.add_argument('--display', help="graphics module to render offscreen with, eg. p3tinydisplay")
+    parser.add_argument('--output', help="write the JSON to this file instead of stdout")
+    args = parser.parse_args()
+
+    core.load_prc_file_data("", "window-type {}\naudio-library-name null\nsync-video #f".format(args.window_type))
+    if args.display:
+        core.load_prc_file_data("", "load-display {}".format(args.display))
+
+    # The game looks for config.prc here, which otherwise is the directory
+    # of this script.
+    core.ExecutionEnvironment.set_environment_variable("MAIN_DIR", core.Filename.from_os_specific(main_dir).get_fullpath())
+
+    random.seed(args.seed)
+
+    # The game's own messages would get in the way of the JSON.
+    with contextlib.redirect_stdout(sys.stderr):
+        from gamelib.game import Game
+
+        game = Game()
+        world = game.world
+        num_pylons, num_wires = build_scenario(world, args.towns, args.pylons, args.wires)
+
+        clock = core.ClockObject.get_global_clock()
+        clock.set_mode(core.ClockObject.M_non_real_time)
+        clock.set_frame_rate(args.fps)
+
+        game.on_game_start()
+        game.game_speed = args.speed
+
+        timings = Timings()
+        if game.win is not None:
+            for dr in game.win.get_active_display_regions():
+                dr.set_cull_callback(time_culling(timings))
+
+        # Get everything loaded and prepared first.
+        for i in range(3):
+            game.task_mgr.step()
+        timings.cull_time = 0.0
+
+        for i in range(args.frames):
+            # Slowly circle around the map, so that the view keeps changing.
+            game.pivot.set_h(game.pivot.get_h() + 360.0 / args.frames)
+
+            start = time.perf_counter()
+            game.task_mgr.step()
+            timings.add("frame", time.perf_counter() - start)
+
+            for task in game.task_mgr.mgr.get_active_tasks():
+                timings.add(task.name, task.dt)
+
+            # The rest of rendering the frame, including flipping the
+            # buffer, is counted as drawing.
+            if game.win is not None:
+                render_time = game.task_mgr.mgr.find_task("igLoop").dt
+                timings.add("cull", timings.cull_time)
+                timings.add("draw", render_time - timings.cull_time)
+                timings.cull_time = 0.0
+
+    result = {
+        "scenario": {
+            "towns": len(world.towns),
+            "pylons": num_pylons,
+            "wires": num_wires,
+            "frames": args.frames,
+            "dt": 1.0 / args.fps,
+            "speed": args.speed,
+            "seed": args.seed,
+        },
+        "window_type": args.window_type,
+        "renderer": game.win.gsg.get_type().name if game.win is not None else None,
+        "timings": timings.summary(args.frames),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(result, fh, indent=2, sort_keys=True)
+    else:
+        json.dump(result, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Times setting up the world on maps of various sizes, and counts the scenery
+chunks and nodes, which shouldn't grow much with the map since most of a big
+map is empty."""
+
+from panda3d import core
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import time
+
+import numpy
+
+
+main_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 256, 1024], help="map widths in grid cells")
+    parser.add_argument('--runs', type=int, default=3, help="take the fastest of this many runs")
+    args = parser.parse_args()
+
+    core.load_prc_file(core.Filename(core.Filename.from_os_specific(main_dir), "config.prc"))
+    core.load_prc_file_data("", "window-type none\naudio-library-name null")
+
+    from direct.showbase.ShowBase import ShowBase
+    from direct.showbase.Audio3DManager import Audio3DManager
+    from gamelib import constants
+    from gamelib.world import World
+
+    base = ShowBase()
+    audio3d = Audio3DManager(base.sfxManagerList[0], base.camera)
+
+    # Get the models loaded.
+    with contextlib.redirect_stdout(io.StringIO()):
+        World(audio3d).root.remove_node()
+
+    print("{:>8} {:>8} {:>14} {:>12} {:>12}".format("grid", "chunks", "scenery nodes", "all nodes", "setup (ms)"))
+    for grid_size in args.sizes:
+        constants.grid_size = grid_size
+        best = None
+        for i in range(args.runs):
+            random.seed(0)
+            numpy.random.seed(0)
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                world = World(audio3d)
+                seconds = time.perf_counter() - start
+                if best is None or seconds < best:
+                    best = seconds
+
+                counts = (len(world.scenery.chunks),
+                          world.scenery.root.count_num_descendants(),
+                          world.root.count_num_descendants())
+                world.root.remove_node()
+
+        print("{:>8} {:>8} {:>14} {:>12} {:>12.1f}".format(grid_size, *counts, best * 1000))
+
+
+if __name__ == '__main__':
+    main()
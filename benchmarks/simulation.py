@@ -0,0 +1,324 @@
+"""Times the hot paths of the simulation on synthetic networks of various
+shapes and sizes, without rendering, and compares the results to a stored
+baseline, flagging the ones that got slower.
+
+    python -m benchmarks.simulation
+    python -m benchmarks.simulation --save-baseline
+
+The exit status is 1 if anything regressed."""
+
+from panda3d import core
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+
+import numpy
+
+
+main_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "simulation_baseline.json")
+
+shapes = ("chain", "grid", "mesh", "star")
+sizes = (10, 100, 1000, 10000)
+
+# Every this many nodes is a town, and the rest are pylons.
+town_interval = 10
+
+# How many positions to pick and wires to draw per measurement.
+num_picks = 100
+num_draws = 100
+
+
+def make_layout(shape, size):
+    """Returns the positions of the given number of nodes, relative to the
+    first one, which is the generator, and the pairs of nodes to connect."""
+
+    spacing = 2.5
+    width = int(math.ceil(math.sqrt(size)))
+    positions = [((i % width) * spacing, (i // width) * spacing) for i in range(size)]
+
+    if shape == "chain":
+        positions = [(i * spacing, 0) for i in range(size)]
+        edges = [(i, i + 1) for i in range(size - 1)]
+
+    elif shape == "star":
+        edges = [(0, i) for i in range(1, size)]
+
+    else:
+        edges = []
+        for i in range(size):
+            x, y = i % width, i // width
+            neighbours = [(x + 1, y), (x, y + 1)]
+            if shape == "mesh":
+                neighbours += [(x + 1, y + 1), (x + 1, y - 1)]
+
+            for nx, ny in neighbours:
+                j = ny * width + nx
+                if nx < width and ny >= 0 and j < size:
+                    edges.append((i, j))
+
+    return positions, edges
+
+
+def build_network(world, shape, size):
+    """Builds the network in the world, next to the generator.  Returns the
+    nodes and the wires."""
+
+    positions, edges = make_layout(shape, size)
+    gen_x, gen_y = world.gen.pos
+
+    nodes = [world.gen]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, (x, y) in enumerate(positions[1:], 1):
+            pos = (gen_x + x, gen_y + y)
+            if i % town_interval == town_interval - 1:
+                world.add_town(pos, "City")
+                nodes.append(world.towns[-1])
+            else:
+                pylon = world.construct_pylon()
+                pylon.position(*pos)
+                pylon.finish_placement()
+                nodes.append(pylon)
+
+        wires = []
+        for i, j in edges:
+            wire = nodes[i].connect_to(nodes[j])
+            wire.finish_placement()
+            wires.append(wire)
+
+    return nodes, wires
+
+
+# A fixed workload, which is timed alongside every path.  Comparing the paths
+# relative to it makes up for the machine being faster or slower at times,
+# such as when it is busy with something else.
+reference_data = [random.Random(0).random() for i in range(1000)]
+
+
+def reference_workload():
+    table = {value: i for i, value in enumerate(sorted(reference_data))}
+    numpy.argsort(numpy.array(reference_data))[table[reference_data[0]]]
+
+
+def measure(run, setup=None, min_time=0.2, min_repeat=5, max_repeat=1000):
+    """Calls run repeatedly, calling setup before each call, until they took
+    at least min_time in total.  Returns the fastest time of a call, and the
+    fastest time of the reference workload, which is run in between.  Like
+    timeit, this turns off the garbage collector while timing."""
+
+    times = []
+    reference_times = []
+    gc.collect()
+    gc.disable()
+    try:
+        while len(times) < min_repeat or (sum(times) < min_time and len(times) < max_repeat):
+            start = time.perf_counter()
+            reference_workload()
+            reference_times.append(time.perf_counter() - start)
+
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    return min(times), min(reference_times)
+
+
+def benchmark_network(world, shape, size):
+    """Returns a dict mapping the name of each path to the time per call, and
+    the time relative to the reference workload."""
+
+    from gamelib import constants
+
+    nodes, wires = build_network(world, shape, size)
+    gen = world.gen
+    connectivity = world.connectivity
+
+    # Get everything into a steady state.
+    world.calc_power(gen, 0.0)
+
+    # Taking a wire away and putting it back forces the connectivity index to
+    # be rebuilt and the pruned network to be recalculated.
+    def invalidate_connectivity():
+        wire = wires[-1]
+        connectivity.remove_wire(wire.origin, wire.target)
+        connectivity.add_wire(wire.origin, wire.target)
+
+    def invalidate_core():
+        invalidate_connectivity()
+        world.find_nodes(gen)
+
+    def invalidate_network():
+        world.topology_version += 1
+
+    # Pick around the nodes.
+    rng = random.Random(size)
+    picks = []
+    for i in range(num_picks):
+        x, y = rng.choice(nodes).pos
+        picks.append((x + rng.uniform(-1, 1), y + rng.uniform(-1, 1)))
+
+    def pick():
+        for x, y in picks:
+            world.pick_closest_construct(x, y)
+
+    drawn = wires[:num_draws]
+
+    def draw_lines():
+        for wire in drawn:
+            wire._draw_lines()
+
+    paths = [
+        ("calc_power", lambda: world.calc_power(gen, 0.0), invalidate_network, 1),
+        ("find_nodes", lambda: world.find_nodes(gen), invalidate_connectivity, 1),
+        ("prune", lambda: connectivity.core(gen), invalidate_core, 1),
+        ("grow_towns", lambda: world.grow_towns(constants.sim_timestep), None, 1),
+        ("pick_closest_construct", pick, None, len(picks)),
+    ]
+    if drawn:
+        paths.append(("draw_lines", draw_lines, None, len(drawn)))
+
+    results = {}
+    for name, run, setup, calls in paths:
+        seconds, reference = measure(run, setup)
+        results[name] = (seconds / calls, seconds / reference)
+
+    return results
+
+
+def compare(relative, baseline, threshold):
+    """Returns the keys of the results that are more than threshold times
+    slower than in the baseline, relative to the reference workload."""
+
+    regressions = []
+    for key, value in sorted(relative.items()):
+        base = baseline.get(key)
+        if base is not None and value > base * threshold:
+            regressions.append(key)
+    return regressions
+
+
+def print_table(results, relative, baseline, regressions, sizes):
+    """Prints the time per call of each path for each shape, with the sizes
+    along the top, so that it reads as a scaling curve."""
+
+    paths = sorted(set(key.split("/")[0] for key in results))
+    for path in paths:
+        print()
+        print("{:<24}".format(path) + "".join("{:>14}".format("{} nodes".format(size)) for size in sizes) + "   (us per call)")
+        for shape in shapes:
+            row = "{:<24}".format(shape)
+            for size in sizes:
+                key = "{}/{}/{}".format(path, shape, size)
+                if key not in results:
+                    row += "{:>14}".format("-")
+                    continue
+
+                cell = "{:.1f}".format(results[key] * 1e6)
+                if key in regressions:
+                    cell += " !{:.1f}x".format(relative[key] / baseline[key])
+                row += "{:>14}".format(cell)
+            print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=",".join(str(size) for size in sizes), help="comma-separated numbers of nodes")
+    parser.add_argument('--shapes', default=",".join(shapes), help="comma-separated network shapes")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', default=baseline_file, help="JSON file to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=2.0, help="flag paths this many times slower than the baseline")
+    args = parser.parse_args()
+
+    run_sizes = [int(size) for size in args.sizes.split(",")]
+    run_shapes = args.shapes.split(",")
+
+    core.load_prc_file(core.Filename(core.Filename.from_os_specific(main_dir), "config.prc"))
+    core.load_prc_file_data("", "window-type none\naudio-library-name null")
+
+    from direct.showbase.ShowBase import ShowBase
+    from direct.showbase.Audio3DManager import Audio3DManager
+    from gamelib.world import World
+
+    base = ShowBase()
+
+    results = {}
+    relative = {}
+    for shape in run_shapes:
+        for size in run_sizes:
+            random.seed(0)
+            numpy.random.seed(0)
+            with contextlib.redirect_stdout(io.StringIO()):
+                world = World(Audio3DManager(base.sfxManagerList[0], base.camera))
+
+            for path, (seconds, ratio) in benchmark_network(world, shape, size).items():
+                key = "{}/{}/{}".format(path, shape, size)
+                results[key] = seconds
+                relative[key] = ratio
+
+            print("{} of {} nodes done".format(shape, size), file=sys.stderr)
+
+            # The constructs say goodbye when they are collected.
+            with contextlib.redirect_stdout(io.StringIO()):
+                world.root.remove_node()
+                del world
+                gc.collect()
+
+    baseline = {}
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)["relative"]
+
+    regressions = compare(relative, baseline, args.threshold)
+    print_table(results, relative, baseline, regressions, run_sizes)
+
+    data = {
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "python": platform.python_version(),
+        },
+        "results": results,
+        "relative": relative,
+        "regressions": regressions,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(data, fh, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as fh:
+            json.dump({"machine": data["machine"], "results": results, "relative": relative}, fh, indent=2, sort_keys=True)
+        print()
+        print("Saved the results as the baseline in {}".format(args.baseline))
+
+    elif not baseline:
+        print()
+        print("There is no baseline to compare to; use --save-baseline to store one.")
+
+    elif regressions:
+        print()
+        print("{} of {} paths are more than {}x slower than the baseline".format(len(regressions), len(results), args.threshold))
+        sys.exit(1)
+
+    else:
+        print()
+        print("No regressions since the baseline.")
+
+
+if __name__ == '__main__':
+    main()
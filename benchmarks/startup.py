@@ -0,0 +1,88 @@
+"""Measures how long it takes to load the models needed at startup, parsing
+them from .egg versus loading them from the .bam model cache, and with the
+loader flags that the game used before and after the city models were made
+to come from the model cache."""
+
+from panda3d import core
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+
+main_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+model_dir = os.path.join(main_dir, "data", "model")
+
+# The models loaded by World.__init__, in the same order.
+startup_models = ["trees"] * 4 + ["trees2"] * 4 + ["trees3"] * 4 + ["trees4"] * 4 + \
+                 ["plant"] + ["hill"] * 3 + ["hill2"] * 3
+
+
+def load(loader, name, flags=0):
+    start = time.perf_counter()
+    options = core.LoaderOptions()
+    options.flags |= flags
+    model = loader.load_sync(name, options)
+    assert model is not None, "failed to load {}".format(name)
+    return time.perf_counter() - start
+
+
+def load_startup_set(loader, towns, city_flags):
+    core.ModelPool.release_all_models()
+
+    total = 0.0
+    for name in startup_models:
+        total += load(loader, name)
+    for i in range(towns):
+        total += load(loader, "city", city_flags)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--towns', type=int, default=2)
+    args = parser.parse_args()
+
+    core.load_prc_file_data("", "model-path {}\nmodel-cache-textures #f".format(core.Filename.from_os_specific(model_dir)))
+    loader = core.Loader.get_global_ptr()
+
+    cache_dir = tempfile.mkdtemp()
+    cache = core.BamCache.get_global_ptr()
+    cache.root = core.Filename.from_os_specific(cache_dir)
+
+    no_cache = core.LoaderOptions.LF_no_cache
+    no_ram_cache = core.LoaderOptions.LF_no_ram_cache
+
+    try:
+        names = sorted(fn[:-4] for fn in os.listdir(model_dir) if fn.endswith(".egg"))
+
+        print("{:<12} {:>10} {:>10} {:>8}".format("model", "egg (ms)", "bam (ms)", "speedup"))
+        for name in names:
+            cache.active = False
+            egg = min(load(loader, name, no_cache) for i in range(args.repeat))
+
+            cache.active = True
+            load(loader, name, no_ram_cache)
+            bam = min(load(loader, name, no_ram_cache) for i in range(args.repeat))
+
+            print("{:<12} {:>10.1f} {:>10.1f} {:>7.1f}x".format(name, egg * 1000, bam * 1000, egg / bam))
+
+        # Panda caches models on disk by default, so the game already loaded
+        # most of them from the cache; it only forced the city to be reparsed
+        # for every town.
+        cache.active = True
+        before = min(load_startup_set(loader, args.towns, no_cache) for i in range(args.repeat))
+        after = min(load_startup_set(loader, args.towns, no_ram_cache) for i in range(args.repeat))
+
+        print()
+        print("Startup models with {} towns: {:.1f} ms before, {:.1f} ms after ({:.1f}x)".format(
+            args.towns, before * 1000, after * 1000, before / after))
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
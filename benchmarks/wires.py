@@ -0,0 +1,155 @@
+"""Measures how quickly wires can be redrawn, using the sag table compared to
+evaluating the sag curve point by point in Python, as the game used to do."""
+
+from panda3d import core
+
+import argparse
+import contextlib
+import io
+import math
+import os
+import time
+
+import numpy
+
+
+main_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def draw_lines_loop(wire):
+    """The old way of drawing a wire, kept here for comparison."""
+
+    from gamelib import constants
+    from gamelib.wire import acosh_scale
+
+    batch = wire.world.wire_batch
+
+    origin_attachments = wire.origin.attachments
+    target_attachments = wire.target.attachments
+
+    if origin_attachments[0].get_quat(batch.path).get_forward().dot(target_attachments[0].get_quat(batch.path).get_forward()) < 0:
+        target_attachments = tuple(reversed(target_attachments))
+
+    sag = wire.origin.allow_wire_sag and wire.target.allow_wire_sag
+    segments = constants.wire_segments
+
+    ti = 0
+    oi = 0
+    tstep = 1
+    ostep = 1
+
+    if len(origin_attachments) > len(target_attachments):
+        tstep = len(target_attachments) / float(len(origin_attachments))
+    elif len(origin_attachments) < len(target_attachments):
+        ostep = len(origin_attachments) / float(len(target_attachments))
+
+    num_lines = max(len(origin_attachments), len(target_attachments))
+    points = numpy.zeros((num_lines, segments + 1, 3), dtype=numpy.float32)
+
+    for i in range(num_lines):
+        from_point = origin_attachments[int(oi)].get_pos(batch.path)
+        to_point = target_attachments[int(ti)].get_pos(batch.path)
+
+        points[i, 0] = from_point
+        for j in range(1, segments):
+            t = j / float(segments)
+            point = from_point * (1 - t) + to_point * t
+            if sag:
+                point.z += constants.wire_sag * (math.cosh((t - 0.5) * acosh_scale) - 2)
+            points[i, j] = point
+        points[i, segments] = to_point
+
+        oi += ostep
+        ti += tstep
+
+    batch.set_lines(wire.index, points)
+
+
+def build_network(world, size):
+    """Places a square grid of pylons, each connected to its neighbours."""
+
+    spacing = 2.5
+    pylons = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for x in range(size):
+            for y in range(size):
+                pylon = world.construct_pylon()
+                pylon.position(x * spacing, y * spacing)
+                pylon.finish_placement()
+                pylons[x, y] = pylon
+
+        wires = []
+        for (x, y), pylon in pylons.items():
+            for other in (pylons.get((x + 1, y)), pylons.get((x, y + 1))):
+                if other is not None:
+                    wire = pylon.connect_to(other)
+                    wire.finish_placement()
+                    wires.append(wire)
+
+        for pylon in pylons.values():
+            pylon.on_update()
+
+    return wires
+
+
+def redraw_rate(wires, draw, repeat):
+    best = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        for wire in wires:
+            draw(wire)
+        best = min(best, time.perf_counter() - start)
+    return len(wires) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--size', type=int, default=16, help="width of the grid of pylons")
+    parser.add_argument('--segments', type=int, default=None, help="override wire_segments")
+    args = parser.parse_args()
+
+    from gamelib import constants
+    if args.segments is not None:
+        constants.wire_segments = args.segments
+
+    core.load_prc_file(core.Filename(core.Filename.from_os_specific(main_dir), "config.prc"))
+    core.load_prc_file_data("", "window-type none\naudio-library-name null")
+
+    from direct.showbase.ShowBase import ShowBase
+    from direct.showbase.Audio3DManager import Audio3DManager
+    from gamelib.world import World
+    from gamelib.wirebatch import vertices_per_wire
+
+    base = ShowBase()
+    world = World(Audio3DManager(base.sfxManagerList[0], base.camera))
+    wires = build_network(world, args.size)
+    world.flush_visuals()
+    batch = world.wire_batch
+
+    # Make sure both ways of drawing agree before timing them.
+    error = 0.0
+    for wire in wires:
+        draw_lines_loop(wire)
+        begin = wire.index * vertices_per_wire
+        end = begin + batch.num_lines[wire.index] * constants.wire_segments * 2
+        expected = batch.points[begin:end].copy()
+        wire._draw_lines()
+        error = max(error, float(numpy.abs(batch.points[begin:end] - expected).max()))
+
+    loop = redraw_rate(wires, draw_lines_loop, args.repeat)
+    table = redraw_rate(wires, lambda wire: wire._draw_lines(), args.repeat)
+
+    start = time.perf_counter()
+    batch.flush()
+    flush = time.perf_counter() - start
+
+    print("{} wires of {} segments, max difference {:.2g}".format(len(wires), constants.wire_segments, error))
+    print("{:<12} {:>14}".format("method", "redraws/s"))
+    print("{:<12} {:>14.0f}".format("python loop", loop))
+    print("{:<12} {:>14.0f} ({:.1f}x)".format("sag table", table, table / loop))
+    print("Flushing all wires to the vertex data took {:.2f} ms".format(flush * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
-from .game import Game
-
 def main():
+    from .game import Game
+
     game = Game()
     game.run()
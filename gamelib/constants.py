@@ -2,18 +2,48 @@ camera_speed = 3.0
 camera_min_zoom = 10.0
 camera_max_zoom = 50.0
 camera_window_border = 100.0
+# How far the camera stays away from the edge of the map.
+camera_map_margin = 4.0
 cycle_unpowered_town_time = 0.6
 max_pylon_distance = 3
 max_wire_heat = 6.0
 show_debug_labels = False
 grid_spacing = 6
+# Width and height of the map, in grid cells.
+grid_size = 8
+
+# The scenery is grouped in chunks of this many grid cells wide, which switch
+# to simpler models when the camera is further than this away.
+scenery_chunk_size = 8
+scenery_lod_distance = 45.0
+
+# How far the ground extends past the edge of the map.
+ground_margin = 26.0
 town_shrink_rate = 1
 wire_sag = 0.4
+# Number of straight segments that each sagging wire is made up of.
+wire_segments = 10
 wire_thickness = 3
 energy_target_multiplier = 1.45
 
+# Either 'sparse' (needs scipy) or 'dense'.
+power_solver = 'sparse'
+
 upgrade_point_rarity = 18000.0
 
+# The simulation is run in fixed steps of this many game time units (one
+# frame at 60 fps at normal speed), up to sim_max_substeps per frame for
+# every 1x of game speed, and for at most sim_tick_budget seconds per frame.
+# Frames longer than sim_max_frame_time seconds are treated as a hitch, and
+# the simulation never falls behind by more than the game time of one.
+sim_timestep = 1 / 120.0
+sim_max_substeps = 8
+sim_tick_budget = 0.012
+sim_max_frame_time = 0.25
+
+# Game speed of fast-forward mode (shift+F).
+turbo_speed = 100.0
+
 music_rate_change_speed = 3.0
 
 label_bob_time = 0.5
@@ -1,27 +1,20 @@
 from panda3d import core
 from direct.interval.IntervalGlobal import LerpPosInterval, Sequence
 
-from .wire import PowerWire
 from . import constants
+from . import textcache
+from . import sim
 
 
-class Construct(object):
+class Construct(sim.Node):
+    """Adds a visual representation to a node of the simulation.  The classes
+    in the constructs module derive from this as well as from the matching
+    simulation class, so this is placed in front of it in the MRO."""
 
     allow_wire_sag = True
-    selection_distance = 2
-    upgradable = False
-    erasable = False
-    wire_conductance = 1
 
-    def __init__(self, world, pos, name):
-        self.world = world
-        self.x, self.y = pos
-
-        self.name = name
-
-        # Starts out as a ghost.
-        self.placed = False
-        self.upgraded = False
+    def __init__(self, world, pos, name, **kwargs):
+        super().__init__(world, pos, name, **kwargs)
 
         self.root = world.root.attach_new_node(name)
         self.root.set_pos(pos[0], pos[1], 0)
@@ -67,8 +60,6 @@ class Construct(object):
             self.label.posInterval(constants.label_bob_time, (0.0, 0, 1.5), bakeInStart=True, blendType='easeInOut'),
         )
 
-        self.connections = {}
-
         if constants.show_debug_labels:
             debug_label_text = core.TextNode("debug_label")
             debug_label_text.set_card_color((0, 0.5, 0, 1))
@@ -83,47 +74,23 @@ class Construct(object):
             self.debug_label.set_bin('fixed', 0)
             self.debug_label.node().set_text("0V")
 
-    def __repr__(self):
-        return "<{} \"{}\">".format(type(self).__name__, self.name)
-
     @property
     def pos(self):
         return core.Point2(self.x, self.y)
 
-    @property
-    def neighbours(self):
-        return [node for node, wire in self.connections.items() if wire.placed]
+    def reset(self):
+        super().reset()
+        self.root.set_pos(self.x, self.y, 0)
+        self.unhighlight()
+        self.set_label('')
 
     def destroy(self):
-        for wire in list(self.connections.values()):
-            wire.destroy()
-
-        assert not self.connections
+        super().destroy()
         self.root.remove_node()
 
-    def finish_placement(self):
-        self.placed = True
-
-    def connect_to(self, other):
-        if other in self.connections:
-            return self.connections[other]
-
-        wire = PowerWire(self.world, self, other)
-        other.connections[self] = wire
-        self.connections[other] = wire
-        return wire
-
     def position(self, x, y):
         self.root.set_pos(x, y, 0)
-        self.x = x
-        self.y = y
-        for wire in self.connections.values():
-            wire.on_update()
-            if wire.origin is self:
-                wire.target.on_update()
-            elif wire.target is self:
-                wire.origin.on_update()
-        self.on_update()
+        super().position(x, y)
 
     def set_label(self, text, important=False):
         self.__label_text = text
@@ -133,7 +100,7 @@ class Construct(object):
             self._do_set_label(text, important)
 
     def _do_set_label(self, text, important):
-        self.label.node().set_text(text)
+        textcache.set_text(self.label.node(), text)
 
         if important is not self.__label_effective_important:
             self.__label_effective_important = important
@@ -218,18 +185,8 @@ class Construct(object):
             self._do_set_label(self.__label_text, self.__label_important)
         self.root.clear_color_scale()
 
-    def on_voltage_change(self, voltage):
-        """Called with the voltage of the node if it's connected."""
-
-        if constants.show_debug_labels:
-            self.debug_label.node().set_text("{:.1f} V".format(voltage))
-
     def on_disconnected(self):
-        """Called instead of on_voltage_change if it's not connected."""
+        super().on_disconnected()
 
         if constants.show_debug_labels:
-            self.debug_label.node().set_text("X")
-
-    def on_update(self):
-        """Updates state based on position information of neighbours."""
-        pass
+            textcache.set_text(self.debug_label.node(), "X")
@@ -1,19 +1,16 @@
 from panda3d import core
 
 from ..construct import Construct
+from .. import sim
 import random
 
 
-class Generator(Construct):
+class Generator(Construct, sim.Generator):
 
     allow_wire_sag = False
 
-    # Behaves like an upgraded pylon.
-    wire_conductance = 3
-
     def __init__(self, world, pos, name):
         Construct.__init__(self, world, pos, name)
-        self.capacity = 1
 
         model = loader.load_model("plant")
         model.reparent_to(self.root)
@@ -1,108 +1,119 @@
-from panda3d import core
-
 from ..construct import Construct
 from .. import constants
+from .. import sim
 
 
-class Pylon(Construct):
+class Pylon(Construct, sim.Pylon):
 
-    selection_distance = 1
-    upgradable = True
-    erasable = True
-    wire_conductance = 0.5
+    #attachment_points = (-0.1, 0.9), (-0.1, 0.7), (-0.15, 0.8), (0, 1), (0.15, 0.9), (0.1, 0.7), (0.1, 0.9)
+    #attachment_points = (-0.25, 0.85), (-0.15, 1.05), (0.15, 1.05), (0.25, 0.85)
+    attachment_points = (-0.25 * 0.8, 0.85 * 0.8), (0, 0.8), (0.25 * 0.8, 0.85 * 0.8)
+    #attachment_points = (-0.25, 0.65), (-0.13, 1), (0.13, 1), (0.25, 0.65)
+    upgraded_attachment_points = (-0.3, 0.6), (-0.25, 0.9), (-0.15, 1.05), (0.15, 1.0), (0.25, 0.9), (0.3, 0.6)
 
     def __init__(self, world, pos, name):
         Construct.__init__(self, world, pos, name)
 
-        self.placed = False
-        self.stashed = False
-
-        self.model = loader.load_model("pylon")
-        self.model.reparent_to(self.root)
-        self.model.set_color_off(1)
+        self.model = None
+        self.__load_model("pylon", self.attachment_points)
         self.model.set_alpha_scale(constants.ghost_alpha)
-        self.model.set_transparency(core.TransparencyAttrib.M_alpha)
 
-        self.upgrade_sound = world.audio3d.load_sfx('drill.ogg')
-        self.upgrade_sound.set_volume(14)
+    def __load_model(self, name, attachment_points):
+        # The model itself is drawn by the world's instance batch for it, which
+        # copies the transform and color scale of this node.
+        if self.model is not None:
+            self.batch.remove(self.instance)
+            self.model.remove_node()
 
-        self.build_sound = world.audio3d.load_sfx('build.ogg')
-        self.build_sound.set_volume(24)
+        self.model = self.root.attach_new_node(name)
+        self.batch = self.world.pylon_batches[name]
+        self.instance = self.batch.add(self.model)
 
         self.attachments = []
-        #for x, z in (-0.1, 0.9), (-0.1, 0.7), (-0.15, 0.8), (0, 1), (0.15, 0.9), (0.1, 0.7), (0.1, 0.9):
-        #for x, z in (-0.25, 0.85), (-0.15, 1.05), (0.15, 1.05), (0.25, 0.85):
-        for x, z in (-0.25 * 0.8, 0.85 * 0.8), (0, 0.8), (0.25 * 0.8, 0.85 * 0.8):
-        #for x, z in (-0.25, 0.65), (-0.13, 1), (0.13, 1), (0.25, 0.65):
+        for x, z in attachment_points:
             attach = self.model.attach_new_node("attach")
             attach.set_pos(x, 0, z)
             self.attachments.append(attach)
 
+    def reset(self):
+        """Turns a pylon from the pool back into a fresh ghost pylon."""
+
+        if self.upgraded:
+            self.__load_model("pylon", self.attachment_points)
+        else:
+            self.model.set_h(0)
+
+        Construct.reset(self)
+
+        self.model.set_alpha_scale(constants.ghost_alpha)
+        self.batch.update(self.instance)
+
     def __del__(self):
         print("Destroying pylon {}".format(self))
 
-    def destroy(self):
-        self.world.pylons.discard(self)
-        Construct.destroy(self)
-
     def upgrade(self):
         if self.upgraded:
             return
 
-        self.upgraded = True
-        self.wire_conductance = 3
+        sim.Pylon.upgrade(self)
 
-        for attach in self.attachments:
-            attach.remove_node()
-        self.attachments = []
+        self.__load_model("superpylon", self.upgraded_attachment_points)
 
-        self.model.remove_node()
-        self.model = loader.load_model("superpylon")
-        self.model.reparent_to(self.root)
-        self.model.set_color_off(1)
+        self.world.sounds.play('drill', self.root.get_pos(self.world.root))
 
-        for x, z in (-0.3, 0.6), (-0.25, 0.9), (-0.15, 1.05), (0.15, 1.0), (0.25, 0.9), (0.3, 0.6):
-            attach = self.model.attach_new_node("attach")
-            attach.set_pos(x, 0, z)
-            self.attachments.append(attach)
+        # The wires need to be moved to the new attachments.
+        self.on_update()
+        for wire in self.connections.values():
+            wire.on_update()
 
-        pos = self.root.get_pos(self.world.root)
-        self.upgrade_sound.set_3d_attributes(pos[0], pos[1], pos[2], 0, 0, 0)
-        self.upgrade_sound.play()
+    def destroy(self):
+        # Destroyed pylons are stashed and reused, so the root is kept.
+        sim.Pylon.destroy(self)
 
-        self.on_update()
+    def position(self, x, y):
+        Construct.position(self, x, y)
+        self.batch.update(self.instance)
+
+    def highlight(self, mode):
+        Construct.highlight(self, mode)
+        self.batch.update(self.instance)
+
+    def unhighlight(self):
+        Construct.unhighlight(self)
+        self.batch.update(self.instance)
 
     def stash(self):
-        self.world.pylons.discard(self)
+        sim.Pylon.stash(self)
         self.root.detach_node()
-        self.stashed = True
+        self.batch.set_visible(self.instance, False)
+        self.world.dirty_headings.pop(self, None)
 
     def unstash(self):
-        self.stashed = False
-        self.world.pylons.add(self)
+        sim.Pylon.unstash(self)
         self.root.reparent_to(self.world.root)
+        self.batch.set_visible(self.instance, True)
 
     def finish_placement(self):
-        Construct.finish_placement(self)
+        sim.Pylon.finish_placement(self)
 
         self.model.set_alpha_scale(1)
-        self.model.clear_transparency()
+        self.batch.update(self.instance)
 
-        pos = self.root.get_pos(self.world.root)
-        self.build_sound.set_3d_attributes(pos[0], pos[1], pos[2], 0, 0, 0)
-        self.build_sound.play()
+        self.world.sounds.play('build', self.root.get_pos(self.world.root))
 
     def on_update(self):
         """Updates state based on position information of neighbours."""
 
-        if len(self.connections) == 0:
+        sim.Pylon.on_update(self)
+        if self.stashed:
             # It's orphaned, so we let it go.
-            if not self.stashed:
-                print("Orphaned pylon {}".format(self))
-                self.stash()
             return
-        else:
-            self.unstash()
+
+        self.world.dirty_headings[self] = None
+
+    def update_heading(self):
+        """Turns the pylon to face its wires.  Called by the world once per
+        frame if on_update was called."""
 
         #TODO: different algo: grab closest two angle, between two connections,
         # then reduce
@@ -122,21 +133,8 @@ class Pylon(Construct):
         prev_h = self.model.get_h()
         if h != prev_h:
             self.model.set_h(h)
+            self.batch.update(self.instance)
 
             # Update wires
             for wire in self.connections.values():
                 wire.on_update()
-
-    def position_within_radius_of(self, x, y, other, max_distance):
-        """Called while it has still one connection."""
-
-        # Limit to max wire length
-        if max_distance is not None:
-            dir = core.Point2(x, y) - other.pos
-            if dir.length_squared() > max_distance ** 2:
-                x, y = other.pos + dir.normalized() * max_distance
-
-        #TODO: limit angle?
-
-        # This also calls on_update.
-        Construct.position(self, x, y)
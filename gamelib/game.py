@@ -5,12 +5,13 @@ from direct.gui.OnscreenText import OnscreenText
 from panda3d import core
 
 from .world import World
+from .sim import Scheduler
 from .panel import Panel
 from .dialog import Dialog
 from . import constants
+from . import textcache
 
 import math
-import random
 import sys
 import os
 
@@ -27,6 +28,17 @@ class Game(ShowBase):
 
         ShowBase.__init__(self)
 
+        if self.mouseWatcherNode is None:
+            # There is no window to take input from, such as when rendering
+            # offscreen for a benchmark.  A mouse watcher without a mouse lets
+            # the rest of the game carry on as usual.
+            self.mouseWatcherNode = core.MouseWatcher()
+
+        if self.camera is None:
+            # Or no window at all, but the game still wants to move a camera.
+            self.camera = self.render.attach_new_node("camera")
+            self.cam = self.camera.attach_new_node(core.Camera("cam"))
+
         try:
             bold_font = loader.load_font("data/font/Roboto-Bold.ttf")
         except:
@@ -74,7 +86,9 @@ class Game(ShowBase):
         self.pivot.set_h(20)
 
         self.clock = core.ClockObject.get_global_clock()
+        self.task_mgr.add(self.__sim_task, sort=-1)
         self.task_mgr.add(self.__game_task)
+        self.task_mgr.add(self.__flush_task, sort=40)
         self.task_mgr.add(self.__music_task)
 
         # Create UI
@@ -89,6 +103,7 @@ class Game(ShowBase):
         self.panel2.add_button("3x Speed", icon=0xf04e, callback=self.on_change_speed, arg=3)
         self.panel2.add_button("Quit", icon=0xf011, callback=self.on_quit, arg=None)
         self.game_speed = 0.0
+        self.scheduler = Scheduler(self.world)
 
         self.unpowered_button = DirectButton(parent=self.a2dTopLeft, pos=(0.13, 0, -0.15), text=u'\uf071', text_font=self.panel.icon_font, text_scale=0.1, text_fg=constants.important_label_color, relief=None, command=self.cycle_unpowered_town)
         self.unpowered_button.hide()
@@ -97,22 +112,15 @@ class Game(ShowBase):
 
         self.time_text = OnscreenText(parent=self.a2dBottomCenter, pos=(-0.1, 0.15), text='January, year 1', fg=(1, 1, 1, 1), scale=0.08)
         self.time_text.hide()
-        self.month = 0.0
-        self.year = 0
 
         self.power_text = OnscreenText(parent=self.a2dBottomCenter, pos=(-0.1, 0.24), text='', fg=(1, 1, 1, 1), scale=0.05)
         self.energy_text = OnscreenText(parent=self.a2dBottomCenter, pos=(-0.1, 0.07), text='', fg=(1, 1, 1, 1), scale=0.05)
-        self.energy = 0.0
-        self.total_energy = 0.0
-        self.power = 0.0
-        self.energy_target = 9000.0
 
         self.upgrade_text = OnscreenText(parent=self.a2dTopRight, align=core.TextNode.A_right, pos=(-0.21, -0.15), text='0', fg=(1, 1, 1, 1), scale=0.08)
         self.upgrade_icon = OnscreenText(parent=self.a2dTopRight, text=u'\uf35b', fg=constants.normal_label_color, pos=(-0.12, -0.16), font=icon_font, scale=0.1)
         self.upgrade_text.hide()
         self.upgrade_icon.hide()
-        self.upgrade_counter = 0.0
-        self.upgrades = 0
+        self.upgrades_shown = 0
 
         self.dialog = Dialog(parent=self.aspect2d, icon_font=icon_font)
 
@@ -126,7 +134,7 @@ class Game(ShowBase):
         self.accept('shift-l', self.render.ls)
         self.accept('shift-p', self.create_stats)
         self.accept('shift-t', self.spawn_town)
-        self.accept('shift-f', self.on_change_speed, [10.0])
+        self.accept('shift-f', self.on_change_speed, [constants.turbo_speed])
         self.accept('tab', self.cycle_unpowered_town)
         self.accept('wheel_up', self.on_zoom, [-1.0])
         self.accept('wheel_down', self.on_zoom, [1.0])
@@ -137,6 +145,7 @@ class Game(ShowBase):
         self.highlighted = None
         self.pylon = None
         self.placing_wire = None
+        self.pick_key = None
         self.tutorial_done = False
 
         # Initial mode
@@ -156,7 +165,7 @@ Try to reach {:.0f} MJ before the year ends!
 NB. Use the arrow
 keys to move around,
 scroll wheel to zoom.
-""".format(self.energy_target / 10), button_text='Of course!', button_icon=0xf04b, callback=self.on_game_start)
+""".format(self.world.energy_target / 10), button_text='Of course!', button_icon=0xf04b, callback=self.on_game_start)
 
     def on_game_start(self):
         for town in self.world.towns:
@@ -173,31 +182,17 @@ scroll wheel to zoom.
 
     def on_begin_month(self, month):
         print("Beginning month {}".format(month))
-        if month == 6:
-            # Sprout third town.
-            spots = list(self.world.beginner_town_spots)
-            random.shuffle(spots)
-
-            # If all spots are already occupied, find some other spot.
-            spots.append(None)
-
-            index = len(self.world.towns)
-            for spot in spots:
-                if spot is None or self.world.grid[spot[0]][spot[1]] == 0:
-                    self.world.sprout_town(grid_pos=spot)
-                    break
+        index = len(self.world.towns)
+        energy = self.world.energy
+        target_met = self.world.begin_month(month)
 
+        if month == 6:
+            # A third town has sprouted.
             self.cycle_unpowered_town(index)
 
         elif month == 12:
-            # We don't actually check energy target here... guess we don't
-            # want to lose the player on the first year.
             self.pause()
-            self.energy_target *= constants.energy_target_multiplier
-
-            if self.upgrades == 0:
-                # Aw, here's an upgrade point.
-                self.on_get_upgrade()
+            self.on_get_upgrade()
 
             text = """
 Great! You may notice in the top-right corner that you are
@@ -207,20 +202,15 @@ your pylons to increase the capacity of its wires.
 Can you supply {:.1f} more GJ by the end of the year?
 
 Another town has sprung up. Press tab to focus it.
-""".format(self.energy_target / 10000)
+""".format(self.world.energy_target / 10000)
             self.dialog.show(text, button_text='Bring it on!', button_icon=0xf04b, callback=self.on_toggle_pause)
 
-            self.world.sprout_town()
-
         elif month % 12 == 0 and month > 0:
             self.pause()
 
-            if self.energy >= self.energy_target:
-                self.next_unpowered_town = len(self.world.towns)
-                self.world.sprout_town()
+            if target_met:
+                self.next_unpowered_town = index
 
-                self.energy_target *= constants.energy_target_multiplier
-                callback = self.on_toggle_pause
                 text = """
 Well done!
 You supplied {:.1f} GJ last year and made it to year {}!
@@ -228,7 +218,7 @@ You supplied {:.1f} GJ last year and made it to year {}!
 Can you supply {:.1f} more GJ by the end of the year?
 
 Another town has sprung up. Press tab to focus it.
-""".format(self.energy / 10000, int(month // 12) + 1, self.energy_target / 10000)
+""".format(energy / 10000, int(month // 12) + 1, self.world.energy_target / 10000)
                 self.dialog.show(text, button_text='Bring it on!', button_icon=0xf04b, callback=self.on_toggle_pause)
             else:
                 text = """
@@ -239,23 +229,21 @@ produced only {:.1f} GJ.
 You produced a grand total of {:.1f} GJ.
 
 Better luck next time!
-""".format(self.energy_target / 10000, self.energy / 10000, self.total_energy / 10000)
+""".format(self.world.energy_target / 10000, energy / 10000, self.world.total_energy / 10000)
                 self.dialog.show(text, button_text='Quit', button_icon=0xf011, callback=sys.exit)
 
-            self.energy = 0.0
-
     def on_get_upgrade(self):
-        self.upgrade_counter = 0.0
-        self.upgrades += 1
+        self.upgrades_shown = self.world.upgrades
 
-        self.upgrade_text['text'] = str(self.upgrades)
+        textcache.set_onscreen_text(self.upgrade_text, str(self.world.upgrades))
         self.upgrade_text.show()
         self.upgrade_icon.show()
 
     def on_use_upgrade(self):
-        self.upgrades -= 1
+        self.world.upgrades -= 1
+        self.upgrades_shown = self.world.upgrades
 
-        self.upgrade_text['text'] = str(self.upgrades)
+        textcache.set_onscreen_text(self.upgrade_text, str(self.world.upgrades))
 
     def __music_task(self, task):
         play_rate = self.music.get_play_rate()
@@ -280,8 +268,8 @@ Better luck next time!
         ver = mw.is_button_down('arrow_up') - mw.is_button_down('arrow_down')
 
         # Check mouse on camera edge.
-        p = base.win.get_pointer(0)
-        if p.in_window and not self.panel.hovered and not self.panel2.hovered:
+        if mw.has_mouse() and not self.panel.hovered and not self.panel2.hovered:
+            p = base.win.get_pointer(0)
             size = base.win.size
             if p.x < constants.camera_window_border:
                 hor -= 2
@@ -292,54 +280,60 @@ Better luck next time!
             if p.y > size.y - constants.camera_window_border:
                 ver -= 2
 
+        # Don't let the camera wander off the map.
+        max_x = self.world.grid.shape[0] * constants.grid_spacing * 0.5 - constants.camera_map_margin
+        max_y = self.world.grid.shape[1] * constants.grid_spacing * 0.5 - constants.camera_map_margin
+
         if hor != 0:
             speed = constants.camera_speed * self.camera.get_pos().length_squared() ** 0.2
             movement = hor * speed * self.clock.dt
             abs_pos = self.world.root.get_relative_point(self.camera_target, (movement, 0, 0))
-            abs_pos.x = min(max(abs_pos.x, -20), 20)
-            abs_pos.y = min(max(abs_pos.y, -20), 20)
+            abs_pos.x = min(max(abs_pos.x, -max_x), max_x)
+            abs_pos.y = min(max(abs_pos.y, -max_y), max_y)
             self.camera_target.set_pos(self.world.root, abs_pos)
 
         if ver != 0:
             speed = constants.camera_speed * self.camera.get_pos().length_squared() ** 0.2
             movement = ver * speed * self.clock.dt
             abs_pos = self.world.root.get_relative_point(self.camera_target, (0, movement, 0))
-            abs_pos.x = min(max(abs_pos.x, -20), 20)
-            abs_pos.y = min(max(abs_pos.y, -20), 20)
+            abs_pos.x = min(max(abs_pos.x, -max_x), max_x)
+            abs_pos.y = min(max(abs_pos.y, -max_y), max_y)
             self.camera_target.set_pos(self.world.root, abs_pos)
 
         return task.cont
 
-    def __game_task(self, task):
-        elapsed = self.clock.dt * self.game_speed * 0.5
-        self.world.step(elapsed)
-
-        if self.game_speed > 0.0:
-            power = 0
-            for town in self.world.towns:
-                if town.powered:
-                    power += town.power
-            self.power = power
-            energy = self.power * self.clock.dt * self.game_speed
-            self.energy += energy
-            self.total_energy += energy
-            self.upgrade_counter += energy / constants.upgrade_point_rarity
-            self.power_text['text'] = '{:.0f} MW'.format(self.power * 0.1)
-            self.energy_text['text'] = '{:.0f} MJ'.format(self.energy * 0.1)
-
-            if self.upgrade_counter > 1:
-                self.on_get_upgrade()
-
-        if self.game_speed != 0:
-            new_month = self.month + elapsed * 0.4
-            year = int(new_month // 12)
-            self.time_text.text = months[int(new_month) % 12] + ', year ' + str(year + 1)
-
-            if int(new_month) != int(self.month):
-                self.on_begin_month(int(new_month))
-
-            self.month = new_month
+    def __sim_task(self, task):
+        """Advances the simulation in fixed-size steps, so that the outcome
+        does not depend on the frame rate."""
+
+        # This is the first task to run each frame.
+        textcache.new_frame()
+
+        speed = self.game_speed
+        self.scheduler.update(self.clock.dt, speed, self.__begin_month_step)
+        if speed == 0:
+            return task.cont
+
+        power, energy = self.scheduler.interpolate()
+        textcache.set_onscreen_text(self.power_text, '{:.0f} MW'.format(power * 0.1))
+        textcache.set_onscreen_text(self.energy_text, '{:.0f} MJ'.format(energy * 0.1))
+
+        if self.world.upgrades > self.upgrades_shown:
+            self.on_get_upgrade()
+
+        month = self.world.month
+        year = int(month // 12)
+        textcache.set_onscreen_text(self.time_text, months[int(month) % 12] + ', year ' + str(year + 1))
+        return task.cont
 
+    def __begin_month_step(self, month):
+        """Called by the scheduler when a new month begins.  Returns whether it
+        should carry on stepping."""
+
+        self.on_begin_month(month)
+        return self.game_speed != 0
+
+    def __game_task(self, task):
         if all(town.powered for town in self.world.towns):
             self.unpowered_button.hide()
 
@@ -356,6 +350,11 @@ Better luck next time!
 
         mw = self.mouseWatcherNode
 
+        # Nothing to do if nothing changed since we last looked at what's
+        # under the mouse.
+        if self.__get_pick_key() == self.pick_key:
+            return task.cont
+
         # Mouse controls
         construct = None
         if mw.has_mouse():
@@ -400,7 +399,7 @@ Better luck next time!
                     construct.highlight("connect")
 
             elif self.mode == 'upgrade':
-                if construct.upgradable and self.upgrades == 0:
+                if construct.upgradable and self.world.upgrades == 0:
                     construct.highlight("upgrade-no-money")
                 elif construct.highlight_mode != 'yay-upgraded':
                     construct.highlight("upgrade")
@@ -410,8 +409,35 @@ Better luck next time!
         elif self.placing_wire:
             self.placing_wire.set_target(self.pylon)
 
+        # This is done afterwards, since the above may have moved things.
+        self.pick_key = self.__get_pick_key()
+
         return task.cont
 
+    def __flush_task(self, task):
+        """Pushes the visual changes made this frame to the scene graph, just
+        before it is rendered."""
+
+        self.world.flush_visuals()
+        return task.cont
+
+    def __get_pick_key(self):
+        """Returns a value that changes whenever the construct under the mouse
+        may have changed, or the way it should be highlighted."""
+
+        mw = self.mouseWatcherNode
+        if mw.has_mouse():
+            mouse = tuple(mw.get_mouse())
+        else:
+            mouse = None
+
+        camera = core.LMatrix4(self.camera.get_mat(self.world.root))
+
+        # The towns become pickable when the game starts, without the
+        # network changing.
+        return (mouse, camera, self.world.edit_version, self.world.upgrades,
+                self.mode, self.tutorial_done)
+
     def spawn_town(self):
         index = len(self.world.towns)
         self.world.sprout_town()
@@ -465,6 +491,8 @@ Better luck next time!
             self.pause()
 
     def on_click(self):
+        self.pick_key = None
+
         if self.mode == 'connect':
             if self.highlighted:
                 self.pylon = self.world.construct_pylon()
@@ -493,6 +521,8 @@ Better luck next time!
                 self.placing_wire = old_pylon.connect_to(self.pylon)
                 self.highlighted = None
             else:
+                # We connected to an existing construct instead.
+                self.world.release_pylon(self.pylon)
                 self.placing_wire = None
                 self.pylon = None
                 self.mode = 'connect'
@@ -508,7 +538,7 @@ Better luck next time!
         elif self.mode == 'upgrade':
             if self.highlighted:
                 if self.highlighted.upgradable and not self.highlighted.upgraded:
-                    if self.upgrades > 0:
+                    if self.world.upgrades > 0:
                         self.highlighted.upgrade()
                         self.on_use_upgrade()
                         self.highlighted.highlight("yay-upgraded")
@@ -526,7 +556,7 @@ Are you sure you want to quit?
 You produced a grand total of {:.1f} GJ.
 
 Press shift + Q to really exit the game.
-""".format(self.total_energy / 10000)
+""".format(self.world.total_energy / 10000)
         self.dialog.show(text, button_text='Keep playing', button_icon=0xf04b, callback=self.on_toggle_pause)
 
     def cycle_unpowered_town(self, index=None):
@@ -550,9 +580,12 @@ Press shift + Q to really exit the game.
             thing.highlight(mode=self.mode)
 
     def cancel_placement(self):
+        self.pick_key = None
+
         if self.mode == 'placing':
             self.placing_wire.set_target(self.pylon)
             self.placing_wire.cancel_placement()
+            self.world.release_pylon(self.pylon)
             self.placing_wire = None
             self.pylon = None
             self.mode = 'connect'
@@ -0,0 +1,215 @@
+from panda3d import core
+import numpy
+
+
+def make_format():
+    vertex_format = core.GeomVertexFormat()
+    vertex_format.add_array(core.GeomVertexArrayFormat("vertex", 3, core.Geom.NT_float32, core.Geom.C_point))
+    vertex_format.add_array(core.GeomVertexArrayFormat("normal", 3, core.Geom.NT_float32, core.Geom.C_normal))
+    vertex_format.add_array(core.GeomVertexArrayFormat("color", 4, core.Geom.NT_float32, core.Geom.C_color))
+    return core.GeomVertexFormat.register_format(vertex_format)
+
+
+def read_array(vdata, i, columns):
+    view = memoryview(vdata.get_array(i)).cast('B')
+    return numpy.frombuffer(view, dtype=numpy.float32).reshape(-1, columns).copy()
+
+
+class InstanceBatch(object):
+    """Draws many copies of the same model with a single Geom.  Each copy
+    follows the transform and color scale of an (empty) node, which is read
+    when the copy is marked as changed with update().
+
+    The copies that are see-through, such as ghost pylons, are drawn by a
+    second Geom sharing the same vertex data, so that only they end up in
+    the transparent bin.
+
+    The model is transformed into place for every copy with numpy, and the
+    vertex data is laid out the same way as in WireBatch.
+    """
+
+    def __init__(self, parent, model, capacity=32):
+        model = model.copy_to(core.NodePath())
+        model.clear_model_nodes()
+        model.flatten_strong()
+
+        geom_node = model.find("**/+GeomNode").node()
+        assert geom_node.get_num_geoms() == 1
+        geom = geom_node.get_geom(0).decompose()
+        state = geom_node.get_geom_state(0)
+
+        # Keep a copy of the model's vertices to transform.
+        self.format = make_format()
+        vdata = geom.get_vertex_data().convert_to(self.format)
+        self.model_points = numpy.ones((vdata.get_num_rows(), 4), dtype=numpy.float32)
+        self.model_points[:, :3] = read_array(vdata, 0, 3)
+        self.model_normals = read_array(vdata, 1, 3)
+        self.model_colors = read_array(vdata, 2, 4)
+
+        tris = geom.get_primitive(0)
+        self.model_indices = numpy.array([tris.get_vertex(i) for i in range(tris.get_num_vertices())], dtype=numpy.uint32)
+        self.rows_per_instance = len(self.model_points)
+        self.model_translucent = bool((self.model_colors[:, 3] < 1).any())
+
+        self.vdata = core.GeomVertexData("instances", self.format, core.Geom.UH_dynamic)
+        self.path = parent.attach_new_node("instances")
+
+        self.geoms = []
+        self.opaque_tris = self.__make_geom("opaque", state)
+        self.translucent_tris = self.__make_geom("translucent", state)
+        self.path.find("translucent").set_transparency(core.TransparencyAttrib.M_alpha)
+
+        self.nodes = []
+        self.free = []
+        self.visible = numpy.zeros(0, dtype=bool)
+        self.translucent = numpy.zeros(0, dtype=bool)
+        self.points = numpy.zeros((0, 3), dtype=numpy.float32)
+        self.normals = numpy.zeros((0, 3), dtype=numpy.float32)
+        self.colors = numpy.zeros((0, 4), dtype=numpy.float32)
+
+        self.dirty = set()
+        self.indices_dirty = False
+
+        self.__grow(capacity)
+
+    def __make_geom(self, name, state):
+        tris = core.GeomTriangles(core.Geom.UH_dynamic)
+        tris.set_index_type(core.Geom.NT_uint32)
+
+        geom = core.Geom(self.vdata)
+        geom.add_primitive(tris)
+        self.geoms.append(geom)
+        node = core.GeomNode(name)
+        node.add_geom(geom, state)
+
+        # The pylons are all over the map anyway, so don't bother culling.
+        node.set_bounds(core.OmniBoundingVolume())
+        node.set_final(True)
+
+        self.path.attach_new_node(node)
+        return tris
+
+    def __grow(self, capacity):
+        old = len(self.nodes)
+        rows = capacity * self.rows_per_instance
+
+        self.nodes += [None] * (capacity - old)
+        self.free += range(capacity - 1, old - 1, -1)
+
+        for name in 'visible', 'translucent':
+            array = numpy.zeros(capacity, dtype=bool)
+            array[:old] = getattr(self, name)
+            setattr(self, name, array)
+
+        for name in 'points', 'normals', 'colors':
+            array = getattr(self, name)
+            new = numpy.zeros((rows, ) + array.shape[1:], dtype=numpy.float32)
+            new[:len(array)] = array
+            setattr(self, name, new)
+
+        self.vdata.unclean_set_num_rows(rows)
+
+        # Copy everything over, since the vertex data was reallocated.
+        self.dirty_begin = 0
+        self.dirty_end = capacity
+
+    def __len__(self):
+        return len(self.nodes) - len(self.free)
+
+    def add(self, node_path):
+        """Adds a copy that follows the given node, and returns its index."""
+
+        if not self.free:
+            self.__grow(len(self.nodes) * 2)
+
+        index = self.free.pop()
+        self.nodes[index] = node_path
+        self.visible[index] = True
+        self.dirty.add(index)
+        self.indices_dirty = True
+        return index
+
+    def remove(self, index):
+        self.nodes[index] = None
+        self.visible[index] = False
+        self.free.append(index)
+        self.dirty.discard(index)
+        self.indices_dirty = True
+
+    def set_visible(self, index, visible):
+        if self.visible[index] != visible:
+            self.visible[index] = visible
+            self.indices_dirty = True
+            if visible:
+                self.dirty.add(index)
+
+    def update(self, index):
+        """Call when the transform or color scale of the node has changed."""
+
+        self.dirty.add(index)
+
+    def flush(self):
+        """Copies the changes into the vertex data.  Should be called once per
+        frame."""
+
+        rows = self.rows_per_instance
+        begin = self.dirty_begin
+        end = self.dirty_end
+
+        for index in self.dirty:
+            node_path = self.nodes[index]
+            if not self.visible[index]:
+                continue
+
+            mat = node_path.get_mat(self.path)
+            mat = numpy.array([mat.get_row(i) for i in range(4)], dtype=numpy.float32)
+
+            scale = node_path.get_net_state().get_attrib(core.ColorScaleAttrib)
+            scale = scale.get_scale() if scale is not None else (1, 1, 1, 1)
+
+            first = index * rows
+            self.points[first:first + rows] = (self.model_points @ mat)[:, :3]
+            normals = self.model_normals @ mat[:3, :3]
+            normals /= numpy.linalg.norm(normals, axis=1)[:, None]
+            self.normals[first:first + rows] = normals
+            self.colors[first:first + rows] = self.model_colors * numpy.array(scale, dtype=numpy.float32)
+
+            translucent = self.model_translucent or scale[3] < 1
+            if self.translucent[index] != translucent:
+                self.translucent[index] = translucent
+                self.indices_dirty = True
+
+            begin = index if begin is None else min(begin, index)
+            end = index + 1 if end is None else max(end, index + 1)
+
+        self.dirty.clear()
+        self.dirty_begin = None
+        self.dirty_end = None
+
+        if begin is not None or self.indices_dirty:
+            # The arrays are modified in place, which doesn't update the
+            # bounds of the Geoms, which the transparent bin sorts by.
+            for geom in self.geoms:
+                geom.mark_bounds_stale()
+
+        if begin is not None:
+            for i, array in enumerate((self.points, self.normals, self.colors)):
+                view = memoryview(self.vdata.modify_array(i)).cast('B')
+                data = numpy.frombuffer(view, dtype=numpy.float32).reshape(array.shape)
+                data[begin * rows:end * rows] = array[begin * rows:end * rows]
+
+        if self.indices_dirty:
+            self.indices_dirty = False
+
+            self.__set_indices(self.opaque_tris, self.visible & ~self.translucent)
+            self.__set_indices(self.translucent_tris, self.visible & self.translucent)
+
+    def __set_indices(self, tris, mask):
+        starts = numpy.nonzero(mask)[0].astype(numpy.uint32) * self.rows_per_instance
+        indices = (starts[:, None] + self.model_indices[None, :]).ravel()
+
+        handle = tris.modify_vertices()
+        handle.unclean_set_num_rows(len(indices))
+        if len(indices) > 0:
+            view = memoryview(handle).cast('B')
+            numpy.frombuffer(view, dtype=numpy.uint32)[:] = indices
@@ -0,0 +1,203 @@
+from panda3d import core
+import math
+import numpy
+
+from . import constants
+
+
+def make_cone(radius, height, sides=6):
+    """Makes a low-poly cone with flat shading, used as a stand-in for a group
+    of trees when seen from afar."""
+
+    vdata = core.GeomVertexData("cone", core.GeomVertexFormat.get_v3n3(), core.Geom.UH_static)
+    vdata.unclean_set_num_rows(sides * 3)
+    vertex = core.GeomVertexWriter(vdata, "vertex")
+    normal = core.GeomVertexWriter(vdata, "normal")
+
+    apex = core.Point3(0, 0, height)
+    for i in range(sides):
+        a1 = 2 * math.pi * i / sides
+        a2 = 2 * math.pi * (i + 1) / sides
+        p1 = core.Point3(math.cos(a1) * radius, math.sin(a1) * radius, 0)
+        p2 = core.Point3(math.cos(a2) * radius, math.sin(a2) * radius, 0)
+        n = (p1 - apex).cross(p2 - apex).normalized()
+        for p in (p1, p2, apex):
+            vertex.add_data3(p)
+            normal.add_data3(n)
+
+    tris = core.GeomTriangles(core.Geom.UH_static)
+    tris.add_next_vertices(sides * 3)
+
+    geom = core.Geom(vdata)
+    geom.add_primitive(tris)
+    node = core.GeomNode("cone")
+    node.add_geom(geom)
+    return core.NodePath(node)
+
+
+def make_grid_lines(min_x, min_y, max_x, max_y, spacing, z=0.0):
+    """Makes a single Geom with lines every spacing units across the given
+    rectangle, except along its lower edges.  The vertices are filled in all
+    at once, so that a bigger map only costs a bigger array."""
+
+    xs = numpy.arange(math.floor(min_x / spacing) + 1, math.floor(max_x / spacing) + 1) * spacing
+    ys = numpy.arange(math.floor(min_y / spacing) + 1, math.floor(max_y / spacing) + 1) * spacing
+
+    # Two vertices per line, the lines along y before the lines along x.
+    points = numpy.empty((len(xs) + len(ys), 2, 3), dtype=numpy.float32)
+    points[:len(xs), :, 0] = xs[:, None]
+    points[:len(xs), 0, 1] = min_y
+    points[:len(xs), 1, 1] = max_y
+    points[len(xs):, 0, 0] = min_x
+    points[len(xs):, 1, 0] = max_x
+    points[len(xs):, :, 1] = ys[:, None]
+    points[:, :, 2] = z
+
+    vdata = core.GeomVertexData("grid", core.GeomVertexFormat.get_v3(), core.Geom.UH_static)
+    vdata.unclean_set_num_rows(len(points) * 2)
+    memoryview(vdata.modify_array(0)).cast('B')[:] = points.tobytes()
+
+    lines = core.GeomLines(core.Geom.UH_static)
+    lines.add_next_vertices(len(points) * 2)
+
+    geom = core.Geom(vdata)
+    geom.add_primitive(lines)
+    node = core.GeomNode("grid")
+    node.add_geom(geom)
+    return core.NodePath(node)
+
+
+class SceneryChunk(object):
+    """The scenery in one square part of the map, which is flattened into a few
+    Geoms.  The shrubbery is replaced by simpler stand-ins when the camera is
+    far away."""
+
+    def __init__(self, parent, key, min_x, min_y, size):
+        self.key = key
+        self.path = parent.attach_new_node("chunk-{}-{}".format(*key))
+
+        self.obstacles = self.path.attach_new_node("obstacles")
+
+        lod = core.LODNode("shrubbery")
+        lod.set_center((min_x + size * 0.5, min_y + size * 0.5, 0))
+        self.lod = self.path.attach_new_node(lod)
+        self.high = self.lod.attach_new_node("high")
+        self.low = self.lod.attach_new_node("low")
+        lod.add_switch(constants.scenery_lod_distance, 0)
+        lod.add_switch(1000000, constants.scenery_lod_distance)
+
+    def flatten(self):
+        # The model roots would otherwise stop the models from being merged.
+        self.path.clear_model_nodes()
+
+        self.obstacles.flatten_strong()
+        self.high.flatten_strong()
+        self.low.flatten_strong()
+
+
+class Scenery(object):
+    """Keeps the static parts of the map in chunks, so that they can be culled
+    and drawn a chunk at a time rather than a model at a time.  Things can be
+    added at any time; the chunks they were added to are flattened again by
+    flush().
+
+    A chunk is only created once something is added to it; the ground and the
+    grid lines underneath are a single card and line set for the whole map,
+    so that empty space costs nothing to set up or to cull."""
+
+    def __init__(self, parent, grid_shape):
+        self.root = parent.attach_new_node("scenery")
+        self.chunk_size = constants.scenery_chunk_size * constants.grid_spacing
+        self.chunks = {}
+        self.dirty_chunks = set()
+        self.low_detail_models = {}
+
+        # The extent of the map, and of the terrain around it.
+        self.map_min = (grid_shape[0] * -0.5 * constants.grid_spacing, grid_shape[1] * -0.5 * constants.grid_spacing)
+        self.map_max = (-self.map_min[0], -self.map_min[1])
+        ground_min = (self.map_min[0] - constants.ground_margin, self.map_min[1] - constants.ground_margin)
+        ground_max = (self.map_max[0] + constants.ground_margin, self.map_max[1] + constants.ground_margin)
+
+        self.ground_material = core.Material()
+        #self.ground_material.diffuse = (218.0/255.0, 234.0/255.0, 182.0/255.0, 1)
+        #self.ground_material.diffuse = (181.0/255.0, 214.0/255.0, 111.0/255.0, 1)
+        self.ground_material.diffuse = (200.0/255.0, 239.0/255.0, 91.0/255.0, 1)
+        self.ground_material.diffuse = self.ground_material.diffuse * 1.5
+        #self.ground_material.diffuse = (2, 2, 2, 1)
+        self.ground_material.ambient = (1, 1, 1, 1)
+
+        cm = core.CardMaker("ground")
+        cm.set_frame(ground_min[0], ground_max[0], ground_min[1], ground_max[1])
+        self.ground = self.root.attach_new_node(cm.generate())
+        self.ground.look_at(0, 0, -1)
+        self.ground.set_bin('background', 0)
+        self.ground.set_attrib(core.DepthTestAttrib.make(core.RenderAttrib.M_always))
+        self.ground.set_depth_write(True)
+        self.ground.set_material(self.ground_material)
+
+        # The grid lines are drawn on top of the ground.
+        self.grid = make_grid_lines(self.map_min[0], self.map_min[1], self.map_max[0], self.map_max[1], 3, z=0.001)
+        self.grid.reparent_to(self.root)
+        self.grid.set_render_mode_thickness(2)
+        self.grid.set_light_off(1)
+        #self.grid.set_color_scale((0.35, 0.35, 0.35, 1))
+        self.grid.set_color_scale((192.0/800.0, 239.0/800.0, 91.0/800.0, 1))
+        self.grid.set_depth_write(False)
+        self.grid.set_bin('background', 10)
+
+    def chunk_key(self, x, y):
+        return (int(math.floor((x - self.map_min[0]) / self.chunk_size)),
+                int(math.floor((y - self.map_min[1]) / self.chunk_size)))
+
+    def chunk_bounds(self, i, j):
+        x0 = self.map_min[0] + i * self.chunk_size
+        y0 = self.map_min[1] + j * self.chunk_size
+        return x0, y0, x0 + self.chunk_size, y0 + self.chunk_size
+
+    def get_chunk(self, i, j):
+        chunk = self.chunks.get((i, j))
+        if chunk is None:
+            x0, y0, x1, y1 = self.chunk_bounds(i, j)
+            chunk = SceneryChunk(self.root, (i, j), x0, y0, self.chunk_size)
+            self.chunks[(i, j)] = chunk
+            self.dirty_chunks.add(chunk)
+        return chunk
+
+    def __get_low_detail_model(self, name, model):
+        low = self.low_detail_models.get(name)
+        if low is None:
+            # Fit a cone to the trees, leaving out the rocks.
+            bounds = model.find("**/Cone").get_tight_bounds(model)
+            radius = min(bounds[1].x - bounds[0].x, bounds[1].y - bounds[0].y) * 0.4
+            low = make_cone(radius, bounds[1].z)
+            low.set_pos((bounds[0].x + bounds[1].x) * 0.5, (bounds[0].y + bounds[1].y) * 0.5, 0)
+            self.low_detail_models[name] = low
+        return low
+
+    def add_shrubbery(self, name, model):
+        """Adds a model of some trees, which has already been positioned in the
+        world, along with a simpler version of it for far away."""
+
+        chunk = self.get_chunk(*self.chunk_key(model.get_x(), model.get_y()))
+
+        low = self.__get_low_detail_model(name, model).copy_to(chunk.low)
+        low.set_transform(model.get_transform().compose(low.get_transform()))
+        low.set_color(model.get_color())
+
+        model.reparent_to(chunk.high)
+        self.dirty_chunks.add(chunk)
+
+    def add_obstacle(self, model):
+        """Adds a model of some rough terrain, which has already been
+        positioned in the world."""
+
+        chunk = self.get_chunk(*self.chunk_key(model.get_x(), model.get_y()))
+        model.reparent_to(chunk.obstacles)
+        self.dirty_chunks.add(chunk)
+
+    def flush(self):
+        """Flattens the chunks that changed since the last call."""
+
+        for chunk in self.dirty_chunks:
+            chunk.flatten()
+        self.dirty_chunks.clear()
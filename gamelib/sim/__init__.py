@@ -0,0 +1,16 @@
+"""The simulation core of the game, which depends only on numpy (and
+optionally scipy), so that it can run without a window, for example to
+simulate many years of play for balancing or regression testing:
+
+    sim = Simulation()
+    pylon = sim.construct_pylon()
+    sim.gen.connect_to(pylon).finish_placement()
+    ...
+    for i in range(10000):
+        sim.advance(0.1)
+"""
+
+from .node import Node, Generator, Pylon, Town
+from .wire import Wire
+from .world import Simulation
+from .scheduler import Scheduler
@@ -0,0 +1,157 @@
+class ConnectivityIndex(object):
+    """Keeps track of which nodes are joined together by placed wires, so
+    that finding everything reachable from a node doesn't require traversing
+    the network.
+
+    Placing a wire merges two components in a union-find structure.  Removing
+    one may split a component, which union-find can't do, so the index is then
+    marked stale and rebuilt from scratch the next time it is queried.
+
+    It also caches the 2-core of components, see core().
+    """
+
+    def __init__(self):
+        self.adjacency = {}
+
+        self.__parent = {}
+        self.__components = {}
+        self.__stale = False
+
+        # Maps start node to (core, component it was computed from).
+        self.__cores = {}
+
+    def add_wire(self, a, b):
+        self.__invalidate_cores(a, b)
+
+        self.adjacency.setdefault(a, set()).add(b)
+        self.adjacency.setdefault(b, set()).add(a)
+
+        if not self.__stale:
+            self.__union(a, b)
+
+    def remove_wire(self, a, b):
+        self.__invalidate_cores(a, b)
+
+        for node, other in (a, b), (b, a):
+            neighbours = self.adjacency.get(node)
+            if neighbours is not None:
+                neighbours.discard(other)
+                if not neighbours:
+                    del self.adjacency[node]
+
+        self.__stale = True
+
+    def component(self, node):
+        """Returns the set of nodes that can be reached from the given node,
+        including the node itself.  The returned set must not be modified."""
+
+        if self.__stale:
+            self.__rebuild()
+
+        root = self.__find(node)
+        return self.__components.get(root) or frozenset((node,))
+
+    def core(self, start):
+        """Returns the nodes reachable from the given node that remain after
+        repeatedly pruning passive nodes (ie. pylons) that have fewer than two
+        connections, since no current can flow through those.  The returned set
+        must not be modified.
+
+        The result is cached until a wire is placed or removed somewhere in
+        the component containing the start node."""
+
+        cached = self.__cores.get(start)
+        if cached is None:
+            members = self.component(start)
+            cached = (self.__peel(members), frozenset(members))
+            self.__cores[start] = cached
+
+        return cached[0]
+
+    def connected(self, a, b):
+        if self.__stale:
+            self.__rebuild()
+
+        return self.__find(a) is self.__find(b)
+
+    def __invalidate_cores(self, a, b):
+        for start, (core, members) in list(self.__cores.items()):
+            if a in members or b in members:
+                del self.__cores[start]
+
+    def __peel(self, members):
+        """Computes the 2-core of the given component in linear time, keeping
+        a count of remaining connections for each node."""
+
+        adjacency = self.adjacency
+        degrees = {}
+        queue = []
+        for node in members:
+            degree = len(adjacency.get(node, ()))
+            degrees[node] = degree
+            if node.passive and degree < 2:
+                queue.append(node)
+
+        pruned = set(queue)
+        while queue:
+            node = queue.pop()
+            for other in adjacency.get(node, ()):
+                if other not in pruned:
+                    degrees[other] -= 1
+                    if other.passive and degrees[other] < 2:
+                        pruned.add(other)
+                        queue.append(other)
+
+        return members - pruned
+
+    def __find(self, node):
+        parent = self.__parent
+        root = parent.get(node, node)
+        while root is not node:
+            # Path splitting.
+            grandparent = parent.get(root, root)
+            parent[node] = grandparent
+            node = root
+            root = grandparent
+        return root
+
+    def __union(self, a, b):
+        root_a = self.__find(a)
+        root_b = self.__find(b)
+        if root_a is root_b:
+            return
+
+        members_a = self.__components.get(root_a) or set((root_a,))
+        members_b = self.__components.get(root_b) or set((root_b,))
+
+        # Merge the smaller component into the larger one.
+        if len(members_a) < len(members_b):
+            root_a, root_b = root_b, root_a
+            members_a, members_b = members_b, members_a
+
+        self.__parent[root_b] = root_a
+        members_a |= members_b
+        self.__components[root_a] = members_a
+        self.__components.pop(root_b, None)
+
+    def __rebuild(self):
+        self.__parent = {}
+        self.__components = {}
+        self.__stale = False
+
+        for start in self.adjacency:
+            if start in self.__parent:
+                continue
+
+            members = set((start,))
+            stack = [start]
+            while stack:
+                node = stack.pop()
+                for other in self.adjacency[node]:
+                    if other not in members:
+                        members.add(other)
+                        stack.append(other)
+
+            for node in members:
+                self.__parent[node] = start
+            self.__components[start] = members
@@ -0,0 +1,85 @@
+import random
+import numpy
+
+
+class WorldGrid(object):
+    """The cells of the map, which are 0 if free, 1 if occupied by a town or
+    some shrubbery, and 2 if the terrain is rough.  Index it with [x, y].
+
+    The cells are kept in square chunks, which are only allocated once
+    something is put in them, so that an empty area costs nothing.
+
+    The free cells are kept in an index for picking a random one, which is a
+    permutation of all cells in which the free cells come first.  Only the
+    entries that differ from the identity permutation are stored, so it too
+    only takes up memory for the occupied cells.
+    """
+
+    def __init__(self, width, height, chunk_size=16):
+        self.shape = (width, height)
+        self.chunk_size = chunk_size
+        self.chunks = {}
+
+        self.free_count = width * height
+        self.slot_cells = {}
+        self.cell_slots = {}
+
+    def __check_bounds(self, x, y):
+        if x < 0 or y < 0 or x >= self.shape[0] or y >= self.shape[1]:
+            raise IndexError("cell ({}, {}) is out of bounds".format(x, y))
+
+    def __getitem__(self, pos):
+        x, y = pos
+        self.__check_bounds(x, y)
+
+        chunk = self.chunks.get((x // self.chunk_size, y // self.chunk_size))
+        if chunk is None:
+            return 0
+        return int(chunk[x % self.chunk_size, y % self.chunk_size])
+
+    def __setitem__(self, pos, value):
+        x, y = pos
+        self.__check_bounds(x, y)
+
+        key = (x // self.chunk_size, y // self.chunk_size)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if value == 0:
+                return
+            chunk = numpy.zeros((self.chunk_size, self.chunk_size), dtype=numpy.int8)
+            self.chunks[key] = chunk
+
+        cx = x % self.chunk_size
+        cy = y % self.chunk_size
+        old_value = chunk[cx, cy]
+        chunk[cx, cy] = value
+
+        cell = x * self.shape[1] + y
+        if old_value == 0 and value != 0:
+            self.__swap(self.cell_slots.get(cell, cell), self.free_count - 1)
+            self.free_count -= 1
+        elif old_value != 0 and value == 0:
+            self.__swap(self.cell_slots.get(cell, cell), self.free_count)
+            self.free_count += 1
+
+    def __swap(self, slot_a, slot_b):
+        cell_a = self.slot_cells.get(slot_a, slot_a)
+        cell_b = self.slot_cells.get(slot_b, slot_b)
+
+        for slot, cell in (slot_a, cell_b), (slot_b, cell_a):
+            if slot == cell:
+                self.slot_cells.pop(slot, None)
+                self.cell_slots.pop(cell, None)
+            else:
+                self.slot_cells[slot] = cell
+                self.cell_slots[cell] = slot
+
+    def random_free_cell(self):
+        """Returns the coordinates of a random free cell, or None if the grid
+        is full."""
+
+        if self.free_count == 0:
+            return None
+
+        slot = random.randrange(self.free_count)
+        return divmod(self.slot_cells.get(slot, slot), self.shape[1])
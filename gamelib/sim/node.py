@@ -0,0 +1,284 @@
+from .. import constants
+from .towntable import category_names
+
+import math
+import numpy
+
+
+class Node(object):
+    """A point in the power network.  This only holds the simulation state;
+    the classes in the constructs module add the visual representation."""
+
+    selection_distance = 2
+    upgradable = False
+    erasable = False
+    wire_conductance = 1
+
+    # Passive nodes neither provide nor consume power.
+    passive = False
+
+    def __init__(self, world, pos, name):
+        self.world = world
+        self.x, self.y = pos
+
+        self.name = name
+
+        # Starts out as a ghost.
+        self.placed = False
+        self.upgraded = False
+
+        self.connections = {}
+
+    def __repr__(self):
+        return "<{} \"{}\">".format(type(self).__name__, self.name)
+
+    @property
+    def pos(self):
+        return (self.x, self.y)
+
+    @property
+    def neighbours(self):
+        return [node for node, wire in self.connections.items() if wire.placed]
+
+    def destroy(self):
+        for wire in list(self.connections.values()):
+            wire.destroy()
+
+        assert not self.connections
+
+    def reset(self):
+        """Puts the node back in its initial state, when it is reused from
+        a pool."""
+
+        assert not self.connections
+        self.x = 0
+        self.y = 0
+        self.placed = False
+        self.upgraded = False
+
+    def finish_placement(self):
+        self.placed = True
+
+    def connect_to(self, other):
+        if other in self.connections:
+            return self.connections[other]
+
+        wire = self.world.construct_wire(self, other)
+        other.connections[self] = wire
+        self.connections[other] = wire
+        self.world.topology_version += 1
+        return wire
+
+    def position(self, x, y):
+        self.x = x
+        self.y = y
+        self.world.spatial_index.move(self)
+        for wire in self.connections.values():
+            wire.on_update()
+            if wire.origin is self:
+                wire.target.on_update()
+            elif wire.target is self:
+                wire.origin.on_update()
+        self.on_update()
+
+    def on_connected(self):
+        """Called when the network is solved, if the node wasn't part of it
+        the last time."""
+        pass
+
+    def on_disconnected(self):
+        """Called whenever the network changes, if the node isn't connected."""
+        pass
+
+    def on_update(self):
+        """Updates state based on position information of neighbours."""
+        pass
+
+
+class Generator(Node):
+
+    # Behaves like an upgraded pylon.
+    wire_conductance = 3
+
+    def __init__(self, world, pos, name):
+        Node.__init__(self, world, pos, name)
+        self.capacity = 1
+
+
+class Pylon(Node):
+
+    selection_distance = 1
+    upgradable = True
+    erasable = True
+    wire_conductance = 0.5
+    passive = True
+
+    def __init__(self, world, pos, name):
+        Node.__init__(self, world, pos, name)
+
+        self.placed = False
+        self.stashed = False
+
+        # Whether it is in the world's pylon pool, waiting to be reused.
+        self.pooled = False
+
+    def destroy(self):
+        Node.destroy(self)
+
+        # Removing the wires normally orphans it already, which also puts it
+        # in the pool.  Either way, it is stashed and pooled to be reused.
+        if not self.stashed:
+            self.stash()
+        self.world.release_pylon(self)
+
+    def reset(self):
+        Node.reset(self)
+        self.wire_conductance = Pylon.wire_conductance
+
+    def upgrade(self):
+        if self.upgraded:
+            return
+
+        self.upgraded = True
+        self.wire_conductance = 3
+        self.world.topology_version += 1
+
+    def stash(self):
+        self.world.pylons.discard(self)
+        self.world.spatial_index.discard(self)
+        self.stashed = True
+
+    def unstash(self):
+        self.stashed = False
+        self.world.pylons.add(self)
+        self.world.spatial_index.add(self)
+
+    def on_update(self):
+        """Updates state based on position information of neighbours."""
+
+        if len(self.connections) == 0:
+            # It's orphaned, so we let it go.
+            if not self.stashed:
+                print("Orphaned pylon {}".format(self))
+                self.stash()
+
+                # Nothing can connect to a placed pylon once it's stashed, so
+                # it can be reused.  Ghost pylons are released by the caller.
+                if self.placed:
+                    self.world.release_pylon(self)
+        else:
+            self.unstash()
+
+    def position_within_radius_of(self, x, y, other, max_distance):
+        """Called while it has still one connection."""
+
+        # Limit to max wire length
+        if max_distance is not None:
+            dir_x = x - other.x
+            dir_y = y - other.y
+            length_sq = dir_x ** 2 + dir_y ** 2
+            if length_sq > max_distance ** 2:
+                scale = max_distance / math.sqrt(length_sq)
+                x = other.x + dir_x * scale
+                y = other.y + dir_y * scale
+
+        #TODO: limit angle?
+
+        # This also calls on_update.
+        self.position(x, y)
+
+
+class Town(Node):
+
+    # We make the last connection point to a town inherently stronger.
+    wire_conductance = 3
+
+    def __init__(self, world, pos, name, placed=False):
+        # Make this city unique.
+        offsets = numpy.random.random_sample((5, 5)) - 0.5
+        self.index = world.town_table.add(self, offsets)
+
+        Node.__init__(self, world, pos, name)
+        self.name = "dwelling"
+        self.placed = placed
+
+        self.random_choices = numpy.random.randint(2, size=(5, 5))
+        self.random_orients = numpy.random.randint(4, size=(5, 5))
+
+    # The state is kept in the world's town table.
+    @property
+    def size(self):
+        return float(self.world.town_table.size[self.index])
+
+    @size.setter
+    def size(self, size):
+        self.world.town_table.size[self.index] = size
+
+    @property
+    def powered(self):
+        return bool(self.world.town_table.powered[self.index])
+
+    @powered.setter
+    def powered(self, powered):
+        self.world.town_table.powered[self.index] = powered
+
+    @property
+    def placed(self):
+        return bool(self.world.town_table.placed[self.index])
+
+    @placed.setter
+    def placed(self, placed):
+        self.world.town_table.placed[self.index] = placed
+
+    @property
+    def grid(self):
+        return self.world.town_table.grid[self.index]
+
+    @property
+    def random_offsets(self):
+        return self.world.town_table.offsets[self.index]
+
+    @property
+    def power(self):
+        return 10 * (self.size ** 0.85)
+
+    @property
+    def resistance(self):
+        return (230 ** 2) / self.power
+
+    @property
+    def current(self):
+        if not self.powered:
+            return 0
+        return 230 / self.resistance
+
+    def power_on(self):
+        self.powered = True
+        self.world.load_version += 1
+
+    def power_off(self):
+        self.powered = False
+        self.world.load_version += 1
+
+    def on_connected(self):
+        if not self.powered:
+            self.power_on()
+
+        Node.on_connected(self)
+
+    def on_disconnected(self):
+        if self.powered:
+            self.power_off()
+
+        Node.on_disconnected(self)
+
+    def on_grid_change(self):
+        """Called when the layout of the city tiles has changed."""
+        pass
+
+    def on_category_change(self):
+        """Called when the town has grown into a different category."""
+
+        # Make up a nice name for it... calling a single building a "city"
+        # seems so silly.
+        self.name = category_names[self.world.town_table.category[self.index]]
@@ -0,0 +1,96 @@
+from .. import constants
+
+import math
+import time
+
+
+class Scheduler(object):
+    """Advances a Simulation in steps of sim_timestep, so that the outcome
+    does not depend on the frame rate or on the game speed.  Game time is
+    accumulated every frame and consumed a step at a time; fast-forward just
+    takes more steps per frame.
+
+    If the steps for a frame don't fit in the budget, the rest of the time is
+    carried over to the next frame rather than dropped, so that the same
+    steps are taken no matter how fast the machine is; the simulation just
+    falls behind for a bit.
+
+    The exception is a machine that is too slow to ever catch up: the backlog
+    is capped at the game time of one hitch (sim_max_frame_time), and any
+    time beyond that is dropped, so that the game slows down rather than
+    falling further and further behind.  Only then does the outcome depend on
+    the speed of the machine.
+    """
+
+    def __init__(self, sim, budget=constants.sim_tick_budget):
+        self.sim = sim
+
+        # Wall-clock seconds to spend per frame at most, or None for no limit.
+        self.budget = budget
+
+        # Game time that has yet to be simulated.
+        self.time = 0.0
+
+        # The counters as of the step before the last, for interpolation.
+        self.prev_power = 0.0
+        self.prev_energy = 0.0
+
+    def update(self, frame_time, speed, on_begin_month):
+        """Accumulates the game time for a frame that took frame_time seconds
+        at the given game speed, and runs as many steps as are due.  When a
+        new month begins, on_begin_month is called with its number; if that
+        returns false, as when the game is paused, the rest of the time is
+        dropped."""
+
+        if speed == 0:
+            # Still pick up any changes the player made to the network.
+            self.sim.step(0.0)
+            return
+
+        timestep = constants.sim_timestep
+
+        # A long frame is treated as a hitch.
+        frame_time = min(frame_time, constants.sim_max_frame_time)
+        self.time += frame_time * speed * 0.5
+
+        # Don't fall behind by more than the game time of a hitch.  Other
+        # than pausing, this is the only way time is dropped; see above.
+        self.time = min(self.time, constants.sim_max_frame_time * speed * 0.5)
+
+        max_substeps = int(math.ceil(constants.sim_max_substeps * speed))
+        if self.budget is not None:
+            deadline = time.perf_counter() + self.budget
+        substeps = 0
+
+        # At least one step is taken per frame, however slow it is.
+        while self.time >= timestep:
+            if substeps >= max_substeps:
+                break
+            if substeps > 0 and self.budget is not None and time.perf_counter() > deadline:
+                break
+
+            self.time -= timestep
+            self.prev_power = self.sim.power
+            self.prev_energy = self.sim.energy
+
+            new_month = self.sim.step(timestep)
+            substeps += 1
+
+            if new_month is not None:
+                keep_going = on_begin_month(new_month)
+                self.prev_energy = self.sim.energy
+
+                if not keep_going:
+                    # Don't run on past a pause at the start of the month.
+                    self.time = 0.0
+                    break
+
+    def interpolate(self):
+        """Returns the power and energy, interpolated between the last two
+        steps, since at high frame rates not every frame runs a step."""
+
+        alpha = min(self.time / constants.sim_timestep, 1.0)
+
+        power = self.prev_power + (self.sim.power - self.prev_power) * alpha
+        energy = self.prev_energy + (self.sim.energy - self.prev_energy) * alpha
+        return power, energy
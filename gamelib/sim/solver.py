@@ -0,0 +1,71 @@
+"""Linear solvers for the Modified Nodal Analysis of the power network.
+
+The matrix is passed in coordinate (COO) form, as parallel sequences of row
+indices, column indices and values; duplicate entries are summed.  It is
+factorized once, after which the factorization can be reused to solve for any
+number of right-hand sides, for as long as the network does not change.
+
+The sparse backend needs scipy, and falls back to the dense one if it is not
+available.
+"""
+
+import numpy
+
+try:
+    from scipy import sparse
+    from scipy.sparse import linalg as sparse_linalg
+except ImportError:
+    sparse = None
+
+
+class DenseFactorization(object):
+    """Inverts a dense matrix.  O(N^3) to factorize, O(N^2) to solve."""
+
+    def __init__(self, size, rows, cols, values):
+        matrix = numpy.zeros((size, size))
+        numpy.add.at(matrix, (rows, cols), values)
+
+        try:
+            self.inverse = numpy.linalg.inv(matrix)
+        except numpy.linalg.LinAlgError:
+            # Shouldn't happen, but better than nothing?
+            self.inverse = numpy.linalg.pinv(matrix)
+
+    def solve(self, ords):
+        return self.inverse.dot(ords)
+
+
+class SparseFactorization(object):
+    """Sparse LU factorization, which scales with the number of wires rather
+    than the number of nodes."""
+
+    def __init__(self, size, rows, cols, values):
+        self.matrix = sparse.coo_matrix((values, (rows, cols)), shape=(size, size)).tocsc()
+
+        try:
+            self.lu = sparse_linalg.splu(self.matrix)
+        except RuntimeError:
+            # Singular matrix; we'll find least-squares solutions instead.
+            self.lu = None
+
+    def solve(self, ords):
+        if self.lu is not None:
+            return self.lu.solve(numpy.asarray(ords, dtype=float))
+        else:
+            return sparse_linalg.lsqr(self.matrix, ords)[0]
+
+
+factorizations = {
+    'dense': DenseFactorization,
+    'sparse': SparseFactorization,
+}
+
+
+def get_factorization(name):
+    """Returns the factorization class for the given backend name."""
+
+    if name == 'sparse' and sparse is None:
+        print("scipy is not available, falling back to dense power solver")
+        name = 'dense'
+
+    return factorizations[name]
@@ -0,0 +1,74 @@
+import math
+
+
+class SpatialHash(object):
+    """Buckets nodes by the square cell of the map they are in, so that the
+    nodes near a given position can be found without looking at all of them.
+    Nodes that move need to be passed to move()."""
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+
+        # Bumped whenever a node is added, removed or moved.
+        self.version = 0
+
+        # Maps cell to a dict used as an ordered set of nodes.
+        self.cells = {}
+        self.node_cells = {}
+
+    def __len__(self):
+        return len(self.node_cells)
+
+    def __contains__(self, node):
+        return node in self.node_cells
+
+    def __cell(self, x, y):
+        return (int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size)))
+
+    def add(self, node):
+        if node in self.node_cells:
+            return
+
+        cell = self.__cell(node.x, node.y)
+        self.node_cells[node] = cell
+        self.cells.setdefault(cell, {})[node] = None
+        self.version += 1
+
+    def discard(self, node):
+        cell = self.node_cells.pop(node, None)
+        if cell is None:
+            return
+
+        nodes = self.cells[cell]
+        del nodes[node]
+        if not nodes:
+            del self.cells[cell]
+        self.version += 1
+
+    def move(self, node):
+        """Call after the position of the node changed."""
+
+        old_cell = self.node_cells.get(node)
+        if old_cell is None:
+            return
+
+        self.version += 1
+        cell = self.__cell(node.x, node.y)
+        if cell != old_cell:
+            self.discard(node)
+            self.node_cells[node] = cell
+            self.cells.setdefault(cell, {})[node] = None
+
+    def nearby(self, x, y, radius):
+        """Yields the nodes in all cells that overlap the square that encloses
+        the given circle.  Some of these may be further away than radius."""
+
+        min_x, min_y = self.__cell(x - radius, y - radius)
+        max_x, max_y = self.__cell(x + radius, y + radius)
+
+        cells = self.cells
+        for cx in range(min_x, max_x + 1):
+            for cy in range(min_y, max_y + 1):
+                nodes = cells.get((cx, cy))
+                if nodes:
+                    yield from nodes
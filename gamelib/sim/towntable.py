@@ -0,0 +1,131 @@
+import math
+import numpy
+
+from .. import constants
+
+
+category_names = [
+    "dwelling",
+    "hamlet",
+    "village",
+    "village",
+    "village",
+    # 50 MW
+    "town", "town", "town", "town", "town",
+    # 100 MW
+    "city", "city", "city", "city", "city",
+    "city", "city", "city", "city", "city",
+    "city", "city", "city", "city", "city",
+    # 250 MW
+    "metropolis",
+]
+
+dist_matrix = numpy.zeros((5, 5))
+for x in range(5):
+    for y in range(5):
+        dist = math.sqrt((x - 2) ** 2 + (y - 2) ** 2)
+        dist /= 2.8284271247461903
+        dist = 1 - dist
+        dist **= 2
+        dist *= 4
+        dist_matrix[x, y] = dist
+
+
+class TownTable(object):
+    """Keeps the state of all towns in stacked arrays, indexed by the index of
+    the town, so that all towns can be grown in a single pass.  Towns are never
+    removed, so the rows are only ever appended."""
+
+    def __init__(self, capacity=16):
+        self.towns = []
+
+        self.size = numpy.ones(0)
+        self.powered = numpy.zeros(0, dtype=bool)
+        self.placed = numpy.zeros(0, dtype=bool)
+        self.category = numpy.zeros(0, dtype=int)
+        self.offsets = numpy.zeros((0, 5, 5))
+        self.grid = numpy.zeros((0, 5, 5), dtype=int)
+
+        self.__grow(capacity)
+
+    def __grow(self, capacity):
+        old = len(self.size)
+
+        def grow(array, fill):
+            new = numpy.full((capacity, ) + array.shape[1:], fill, dtype=array.dtype)
+            new[:old] = array
+            return new
+
+        self.size = grow(self.size, 1)
+        self.powered = grow(self.powered, False)
+        self.placed = grow(self.placed, False)
+        self.category = grow(self.category, 0)
+        self.offsets = grow(self.offsets, 0)
+        self.grid = grow(self.grid, 0)
+
+    def __len__(self):
+        return len(self.towns)
+
+    def add(self, town, offsets):
+        """Allocates a row for the given town, and returns its index."""
+
+        index = len(self.towns)
+        if index >= len(self.size):
+            self.__grow(len(self.size) * 2)
+
+        self.towns.append(town)
+        self.size[index] = 1
+        self.powered[index] = False
+        self.placed[index] = False
+        self.category[index] = 0
+        self.offsets[index] = offsets
+        self.grid[index] = 0
+        self.grid[index, 2, 2] = 1
+        return index
+
+    @property
+    def power(self):
+        """The power drawn by each town, whether it is powered or not."""
+        return 10 * (self.size[:len(self.towns)] ** 0.85)
+
+    def total_power(self):
+        """Returns the total power drawn by the powered towns."""
+        count = len(self.towns)
+        return float(self.power[self.powered[:count]].sum())
+
+    def grow(self, dt):
+        """Grows the powered towns and shrinks the unpowered ones.  Returns
+        whether any town changed in size, the indices of the towns whose tiles
+        changed and the indices of the towns whose category changed."""
+
+        count = len(self.towns)
+        placed = self.placed[:count]
+        old_size = self.size[:count]
+
+        size = numpy.where(self.powered[:count], old_size + dt,
+                           numpy.maximum(1, old_size - dt * constants.town_shrink_rate))
+        size = numpy.where(placed, size, old_size)
+        resized = (size != old_size).any()
+        self.size[:count] = size
+
+        #growth = 4.5 - (500 / (size + (500 / 4.5)))
+        growth = 8 - (1000 / (size * 0.4 + (1000 / 8)))
+
+        # Compute new tiles.
+        new_grid = numpy.rint((dist_matrix + self.offsets[:count]) * growth[:, None, None])
+        # Not numpy.clip, which is much slower for small arrays.
+        numpy.minimum(numpy.maximum(new_grid, 0, out=new_grid), 4, out=new_grid)
+        new_grid = new_grid.astype(int)
+
+        # Always a house in the center.
+        numpy.maximum(new_grid[:, 2, 2], 1, out=new_grid[:, 2, 2])
+
+        regridded = placed & (new_grid != self.grid[:count]).any(axis=(1, 2))
+        regridded = numpy.nonzero(regridded)[0]
+        self.grid[regridded] = new_grid[regridded]
+
+        category = numpy.minimum(size // 10, len(category_names) - 1).astype(int)
+        recategorized = numpy.nonzero(placed & (category != self.category[:count]))[0]
+        self.category[recategorized] = category[recategorized]
+
+        return resized, regridded, recategorized
@@ -0,0 +1,137 @@
+from .. import constants
+
+
+class Wire(object):
+    """A connection between two nodes.  This only holds the simulation state;
+    the electrical state is kept in the world's wire table, and the wire
+    module adds the visual representation."""
+
+    def __init__(self, world, origin, target):
+        self.world = world
+        self.origin = origin
+        self.target = target
+
+        # If placed is false, then self.target does not know about self yet.
+        self.placed = False
+
+        self.index = world.wires.add(self)
+
+    def reset(self, origin, target):
+        """Reuses a destroyed wire from the pool to connect the given nodes."""
+
+        self.origin = origin
+        self.target = target
+        self.placed = False
+        self.index = self.world.wires.add(self)
+
+    def __repr__(self):
+        r = "{!r}--{!r}".format(self.origin, self.target)
+        if self.heat > 0.0:
+            r += " (HOT:{:.1f})".format(self.heat)
+        return r
+
+    @property
+    def heat(self):
+        return self.world.wires.heat[self.index]
+
+    @property
+    def resistance(self):
+        # 1 ohm normally, but 0.2 if target or origin is upgraded.
+        # If target and origin are both pylons, but only one are upgraded, the
+        # effective resistance is only 0.45.
+        if self.target and self.origin:
+            return (1.0 / (self.origin.wire_conductance + self.target.wire_conductance))
+        return 1.0
+
+    @property
+    def overheated(self):
+        return self.heat >= constants.max_wire_heat
+
+    def try_set_target(self, to):
+        """Try changing the target of the wire, for use during placement."""
+        assert not self.placed
+
+        if to is None:
+            return False
+
+        if to is self.origin:
+            return False
+
+        if not to.placed:
+            return False
+
+        # Already a placed connection here?
+        if to in self.origin.connections and self.origin.connections[to].placed:
+            return False
+
+        dist_sq = (self.origin.x - to.x) ** 2 + (self.origin.y - to.y) ** 2
+        if dist_sq > (constants.max_pylon_distance + to.selection_distance) ** 2:
+            return False
+
+        self.set_target(to)
+        return True
+
+    def set_target(self, to):
+        """During placement, force connecting to this node."""
+        assert to is not self.origin
+
+        if self.target is not to:
+            del self.target.connections[self.origin]
+            del self.origin.connections[self.target]
+            self.target.on_update()
+
+            self.target = to
+            self.target.connections[self.origin] = self
+            self.origin.connections[self.target] = self
+            self.on_update()
+
+            self.target.on_update()
+            self.origin.on_update()
+
+    def cancel_placement(self):
+        del self.target.connections[self.origin]
+        del self.origin.connections[self.target]
+
+        self.on_update()
+        self.destroy()
+
+    def finish_placement(self):
+        assert not self.placed
+        self.placed = True
+        self.world.topology_version += 1
+        self.world.connectivity.add_wire(self.origin, self.target)
+
+        print("Finishing placement of {}".format(self))
+        if not self.target.placed:
+            self.target.finish_placement()
+
+    def destroy(self):
+        if self.origin.connections.get(self.target) is self:
+            del self.origin.connections[self.target]
+
+        if self.target.connections.get(self.origin) is self:
+            del self.target.connections[self.origin]
+
+        self.world.topology_version += 1
+        if self.placed:
+            self.world.connectivity.remove_wire(self.origin, self.target)
+
+        self.origin.on_update()
+        self.target.on_update()
+
+        self.world.wires.remove(self.index)
+        self.world.wire_pool.append(self)
+
+    def snap(self):
+        """Called when the wire has overheated."""
+
+        print("Removing overheated wire {}".format(self))
+        self.destroy()
+
+    def on_color_change(self, color):
+        """Called when the wire should be shown in a different color."""
+        pass
+
+    def on_update(self):
+        """Called when position information of neighbours changes."""
+        pass
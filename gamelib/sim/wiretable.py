@@ -0,0 +1,159 @@
+import numpy
+
+from .. import constants
+
+
+class WireTable(object):
+    """Keeps the electrical state of all wires in flat arrays, indexed by the
+    index of the wire, so that it can be updated for all wires at once.
+
+    The endpoints refer to indices in the array of voltages passed into
+    set_voltages, and are assigned by set_network whenever the topology of
+    the network changes.
+    """
+
+    def __init__(self, capacity=64):
+        self.wires = []
+        self.free = []
+
+        self.origins = numpy.zeros(0, dtype=int)
+        self.targets = numpy.zeros(0, dtype=int)
+        self.resistance = numpy.ones(0)
+        self.power = numpy.zeros(0)
+        self.heat = numpy.zeros(0)
+        self.colors = numpy.zeros((0, 4))
+
+        # How many ends of the wire are part of the network, which is also how
+        # many times per step its heat is integrated.  Wires with multiplicity
+        # zero are left alone entirely.
+        self.multiplicity = numpy.zeros(0, dtype=int)
+
+        # Whether current can flow through it, ie. it is placed and both ends
+        # are part of the network.
+        self.conducting = numpy.zeros(0, dtype=bool)
+
+        # Indices of the wires with a nonzero multiplicity.
+        self.active = numpy.zeros(0, dtype=int)
+
+        self.__grow(capacity)
+
+    def __grow(self, capacity):
+        old = len(self.wires)
+        self.wires += [None] * (capacity - old)
+        self.free += range(capacity - 1, old - 1, -1)
+
+        def grow(array, fill):
+            new = numpy.full((capacity, ) + array.shape[1:], fill, dtype=array.dtype)
+            new[:old] = array
+            return new
+
+        self.origins = grow(self.origins, 0)
+        self.targets = grow(self.targets, 0)
+        self.resistance = grow(self.resistance, 1)
+        self.power = grow(self.power, 0)
+        self.heat = grow(self.heat, 0)
+        self.colors = grow(self.colors, numpy.nan)
+        self.multiplicity = grow(self.multiplicity, 0)
+        self.conducting = grow(self.conducting, False)
+
+    def add(self, wire):
+        """Allocates a row for the given wire, and returns its index."""
+
+        if not self.free:
+            self.__grow(len(self.wires) * 2)
+
+        index = self.free.pop()
+        self.wires[index] = wire
+        self.power[index] = 0
+        self.heat[index] = 0
+        self.colors[index] = numpy.nan
+        self.multiplicity[index] = 0
+        self.conducting[index] = False
+        return index
+
+    def remove(self, index):
+        self.wires[index] = None
+        self.multiplicity[index] = 0
+        self.conducting[index] = False
+        self.active = self.active[self.active != index]
+        self.free.append(index)
+
+    def forget_color(self, index):
+        """Call this if the color of the wire was changed by other means, so
+        that it will be set again on the next call to set_voltages."""
+
+        self.colors[index] = numpy.nan
+
+    def set_network(self, indices, origins, targets):
+        """Assigns the endpoints of the wires that are part of the network.
+        The arguments are parallel sequences, listing each wire once for every
+        end that is part of the network.  A target of -1 means that no current
+        flows through the wire."""
+
+        indices = numpy.asarray(indices, dtype=int)
+        origins = numpy.asarray(origins, dtype=int)
+        targets = numpy.asarray(targets, dtype=int)
+
+        self.multiplicity[:] = 0
+        self.conducting[:] = False
+        numpy.add.at(self.multiplicity, indices, 1)
+
+        mask = targets >= 0
+        self.conducting[indices[mask]] = True
+        self.origins[indices[mask]] = origins[mask]
+        self.targets[indices[mask]] = targets[mask]
+
+        self.active = numpy.flatnonzero(self.multiplicity)
+        for index in self.active:
+            self.resistance[index] = self.wires[index].resistance
+
+    def set_voltages(self, voltages):
+        """Determines the current through each wire based on the voltages at
+        the nodes.  Returns the indices of the wires that changed color."""
+
+        active = self.active
+        conducting = active[self.conducting[active]]
+
+        # Calc current from voltage differential and resistance.
+        resistance = self.resistance[conducting]
+        current = numpy.abs(voltages[self.origins[conducting]] - voltages[self.targets[conducting]]) / resistance
+        self.power[active] = 0
+        self.power[conducting] = current ** 2 * resistance
+
+        power = self.power[active]
+        colors = numpy.empty((len(active), 4))
+        colors[:] = (0.05, 0.05, 0.05, 1)
+        colors[power > 0] = (1, 1, 1, 1)
+        warm = (power > 1) & (power <= 2)
+        colors[warm, 1] = 2 - power[warm]
+        colors[warm, 2] = 2 - power[warm]
+        colors[power > 2] = (1, 0, 0, 1)
+
+        changed = (colors != self.colors[active]).any(axis=1)
+        self.colors[active] = colors
+        return active[changed]
+
+    def integrate(self, dt):
+        """Lets the wires heat up or cool down based on the power flowing
+        through them.  Returns the index of the hottest overheated wire, or
+        None if no wires are overheated."""
+
+        active = self.active
+        if len(active) == 0:
+            return None
+
+        power = self.power[active]
+        heat = self.heat[active]
+        dt = self.multiplicity[active] * dt
+
+        # Above 2 W they start overheating; below that they cool down, and
+        # faster if there's barely anything flowing through them at all.
+        heat = numpy.where(power > 2, heat + numpy.minimum(power - 2, 1) * dt,
+               numpy.where(power > 1, numpy.maximum(heat - dt, 0),
+               numpy.where(power > 0, numpy.maximum(heat - 2 * dt, 0), 0)))
+        self.heat[active] = heat
+
+        overheated = heat >= constants.max_wire_heat
+        if overheated.any():
+            return active[numpy.argmax(numpy.where(overheated, heat, -numpy.inf))]
+        return None
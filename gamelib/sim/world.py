@@ -0,0 +1,531 @@
+from .. import constants
+from . import solver
+from .node import Generator, Pylon, Town
+from .wire import Wire
+from .connectivity import ConnectivityIndex
+from .wiretable import WireTable
+from .towntable import TownTable
+from .spatial import SpatialHash
+from .grid import WorldGrid
+
+import numpy
+import random
+
+
+class Simulation(object):
+    """The game logic, without any rendering: the map grid, the power network
+    and the towns on it, and the energy accounting.  This can run without a
+    window; the World class in the world module adds the visuals by
+    substituting the node and wire types with the ones from the constructs
+    and wire modules, and by overriding the on_* hooks."""
+
+    # Relative to the center of the map.
+    beginner_town_spots = [(-2, -1), (-1, 2), (-3, 1), (1, -1), (-1, -2)]
+
+    generator_type = Generator
+    pylon_type = Pylon
+    town_type = Town
+    wire_type = Wire
+
+    def __init__(self):
+        self.towns = []
+        self.pylons = set()
+
+        # Contains the towns, the generator and the pylons that are in
+        # self.pylons, for looking up nodes by position.
+        self.spatial_index = SpatialHash(constants.grid_spacing)
+        self.connectivity = ConnectivityIndex()
+
+        # Bumped whenever the wires or the conductances between nodes change,
+        # or whenever the towns start drawing a different amount of power.
+        self.topology_version = 0
+        self.load_version = 0
+
+        self.factorization = solver.get_factorization(constants.power_solver)
+        self.__power_topology_version = None
+        self.__power_load_version = None
+        self.__power_nodes = ()
+        self.__power_voltages = ()
+
+        self.wires = WireTable()
+        self.town_table = TownTable()
+
+        # Pylons and wires that are no longer in use, to be reused by
+        # construct_pylon and construct_wire.
+        self.pylon_pool = []
+        self.wire_pool = []
+
+        # Energy accounting.
+        self.month = 0.0
+        self.power = 0.0
+        self.energy = 0.0
+        self.total_energy = 0.0
+        self.energy_target = 9000.0
+        self.upgrade_counter = 0.0
+        self.upgrades = 0
+
+        # How much energy was supplied in the year that last ended.
+        self.last_year_energy = 0.0
+
+        # Grid prevents building towns at already occupied places.
+        self.grid = WorldGrid(constants.grid_size, constants.grid_size)
+
+        # Build one town at a fixed location.
+        self.sprout_town(grid_pos=self.center_cell(1, 0))
+
+        # And two at an arbitrary, close, but not in-view spot.
+        self.sprout_town(grid_pos=self.center_cell(*random.choice(self.beginner_town_spots)), placed=False)
+
+        # Determine coordinates for generator and claim it.
+        x, y = self.center_cell(-1, 0)
+        self.grid[x, y] = 1
+
+        # Oh, also spawn in some shrubberies, and litter them around the map.
+        for i in range(4):
+            self.sprout_shrubbery("trees")
+        for i in range(4):
+            self.sprout_shrubbery("trees2")
+        for i in range(4):
+            self.sprout_shrubbery("trees3")
+        for i in range(4):
+            self.sprout_shrubbery("trees4")
+
+        # Build generator.  Block off everything in the immediate vicinity.
+        self.grid[x+1, y] = 1
+        self.grid[x-1, y] = 1
+        self.grid[x, y-1] = 1
+        self.grid[x+1, y-1] = 1
+        self.grid[x-1, y-1] = 1
+        self.grid[x, y+1] = 1
+        self.grid[x+1, y+1] = 1
+        self.grid[x-1, y+1] = 1
+        x -= self.grid.shape[0] / 2
+        y -= self.grid.shape[1] / 2
+        self.gen = self.generator_type(self, (x * constants.grid_spacing, y * constants.grid_spacing), "Power Plant")
+        self.gen.placed = True
+        self.spatial_index.add(self.gen)
+
+        # And some impassable terrain.
+        for i in range(3):
+            self.sprout_obstacle("hill")
+        for i in range(3):
+            self.sprout_obstacle("hill2")
+
+    def construct_pylon(self):
+        """Call this to construct additional pylons.  Reuses a pylon from the
+        pool if there is one."""
+
+        if self.pylon_pool:
+            pylon = self.pylon_pool.pop()
+            pylon.pooled = False
+            pylon.reset()
+            pylon.unstash()
+            return pylon
+
+        pylon = self.pylon_type(self, (0, 0), "Pylon")
+        self.pylons.add(pylon)
+        self.spatial_index.add(pylon)
+        return pylon
+
+    def release_pylon(self, pylon):
+        """Puts a stashed pylon that is no longer referenced in the pool.  Does
+        nothing if it is in the pool already."""
+
+        assert pylon.stashed and not pylon.connections
+        if not pylon.pooled:
+            pylon.pooled = True
+            self.pylon_pool.append(pylon)
+
+    def construct_wire(self, origin, target):
+        """Creates a wire between the given nodes.  Reuses a wire from the pool
+        if there is one."""
+
+        if self.wire_pool:
+            wire = self.wire_pool.pop()
+            wire.reset(origin, target)
+            return wire
+
+        return self.wire_type(self, origin, target)
+
+    def center_cell(self, x, y):
+        """Returns the grid cell at the given offset from the center."""
+
+        return self.grid.shape[0] // 2 + x, self.grid.shape[1] // 2 + y
+
+    def find_free_grid_spot(self):
+        """Returns a random free grid cell, or None if the map is full."""
+
+        return self.grid.random_free_cell()
+
+    def sprout_town(self, grid_pos=None, placed=True):
+        if grid_pos is not None:
+            x, y = grid_pos
+        else:
+            spot = self.find_free_grid_spot()
+            if spot is None:
+                print("No room left to sprout a town")
+                return
+            x, y = spot
+
+        self.grid[x, y] = 1
+
+        x -= self.grid.shape[0] / 2
+        y -= self.grid.shape[1] / 2
+
+        town = self.town_type(self, (x * constants.grid_spacing, y * constants.grid_spacing), "City", placed=placed)
+        self.towns.append(town)
+        self.spatial_index.add(town)
+
+    def sprout_shrubbery(self, model):
+        """Claims a free grid cell for the given shrubbery model, and returns
+        its coordinates relative to the center of the map, or None if the map
+        is full."""
+
+        spot = self.find_free_grid_spot()
+        if spot is None:
+            return None
+
+        x, y = spot
+        self.grid[x, y] = 1
+
+        x -= self.grid.shape[0] / 2
+        y -= self.grid.shape[1] / 2
+        return x, y
+
+    def sprout_obstacle(self, model):
+        """Claims a free grid cell for the given impassable terrain model, and
+        returns its coordinates relative to the center of the map, or None if
+        the map is full."""
+
+        spot = self.find_free_grid_spot()
+        if spot is None:
+            return None
+
+        x, y = spot
+        self.grid[x, y] = 2
+
+        x -= self.grid.shape[0] / 2
+        y -= self.grid.shape[1] / 2
+        return x, y
+
+    def add_town(self, pos, name):
+        town = self.town_type(self, pos, name, placed=True)
+        self.towns.append(town)
+        self.spatial_index.add(town)
+
+    def is_buildable_terrain(self, x, y):
+        """Returns false if the indicated grid cell is rough terrain."""
+
+        x /= constants.grid_spacing
+        y /= constants.grid_spacing
+
+        x += self.grid.shape[0] / 2
+        y += self.grid.shape[1] / 2
+
+        x = int(round(x))
+        y = int(round(y))
+
+        if x < 0 or y < 0 or x >= self.grid.shape[0] or y >= self.grid.shape[1]:
+            # Out of bounds
+            return False
+
+        return self.grid[x, y] < 2
+
+    @property
+    def edit_version(self):
+        """Changes whenever nodes or wires are added, removed or moved, or the
+        network is otherwise changed."""
+        return (self.topology_version, self.spatial_index.version)
+
+    def pick_closest_construct(self, x, y, max_radius=None):
+        """Returns the node that falls within the given radius of the given position."""
+
+        closest = None
+        closest_dist_sq = float("inf")
+        if max_radius is not None:
+            closest_dist_sq = max_radius ** 2
+
+        # Nothing can be selected from further away than this.
+        radius = max(self.generator_type.selection_distance,
+                     self.pylon_type.selection_distance,
+                     self.town_type.selection_distance)
+
+        for construct in self.spatial_index.nearby(x, y, radius):
+            if not construct.placed:
+                continue
+
+            dist_sq = (construct.x - x) ** 2 + (construct.y - y) ** 2
+            if dist_sq < closest_dist_sq and dist_sq < (construct.selection_distance ** 2):
+                closest = construct
+                closest_dist_sq = dist_sq
+
+        return closest
+
+    def calc_power(self, start, dt):
+        """Calculates the voltages at each node and the current through each
+        wire, then lets the wires heat up accordingly.  The network is only
+        solved again if its topology or the loads on it have changed."""
+
+        if self.__power_topology_version != self.topology_version:
+            self.__power_topology_version = self.topology_version
+            self.__power_load_version = None
+            self.__build_power_network(start)
+
+        if self.__power_load_version != self.load_version:
+            self.__power_load_version = self.load_version
+            self.__solve_power_network()
+
+        hottest = self.wires.integrate(dt)
+
+        # Remove the hottest wire.
+        if hottest is not None and dt >= 0.0:
+            self.wires.wires[hottest].snap()
+
+    def __build_power_network(self, start):
+        """Determines which nodes take part in the network, and factorizes the
+        matrix of the linear system for Modified Nodal Analysis."""
+
+        previous_nodes = set(self.__power_nodes)
+
+        self.__power_nodes = ()
+        self.__power_new_nodes = ()
+        self.__power_voltages = ()
+        self.__power_town_slots = None
+        self.__power_town_rows = None
+        self.__power_factorization = None
+        self.wires.set_network((), (), ())
+
+        # Gather all nodes connected
+        nodes = self.find_nodes(start)
+
+        # Other pylons are disconnected.
+        for node in self.pylons - nodes:
+            node.on_disconnected()
+
+        # So are towns that can't be reached by the generator.
+        for town in self.towns:
+            if town not in nodes:
+                town.on_disconnected()
+
+        # Prune nodes with only one connection, unless they provide or consume
+        # power.
+        core = self.connectivity.core(start)
+        for node in nodes - core:
+            node.on_disconnected()
+        nodes = set(core)
+
+        if len(nodes) <= 1:
+            for node in nodes:
+                node.on_disconnected()
+            return
+
+        # The generator is used as the reference node, so it goes first and is
+        # left out of the matrix.  That leaves the conductance matrix, which
+        # only depends on the wires, and not on the loads.
+        nodes.discard(start)
+        nodes = (start,) + tuple(nodes)
+        indices = {node: i for i, node in enumerate(nodes)}
+        rows = []
+        cols = []
+        values = []
+
+        for i, node in enumerate(nodes):
+            if i == 0:
+                continue
+
+            for node2 in node.neighbours:
+                j = indices.get(node2)
+                if j is not None:
+                    conductance = 1 / node.connections[node2].resistance
+                    rows.append(i - 1)
+                    cols.append(i - 1)
+                    values.append(conductance)
+                    if j != 0:
+                        rows.append(i - 1)
+                        cols.append(j - 1)
+                        values.append(-conductance)
+
+        # Wires are listed once for every end that's part of the network.
+        wire_indices = []
+        wire_origins = []
+        wire_targets = []
+        for i, node in enumerate(nodes):
+            for other, wire in node.connections.items():
+                wire_indices.append(wire.index)
+                wire_origins.append(i)
+                if wire.placed and other in indices:
+                    wire_targets.append(indices[other])
+                else:
+                    wire_targets.append(-1)
+
+        self.wires.set_network(wire_indices, wire_origins, wire_targets)
+
+        # Where the towns are among the nodes, and in the town table, so that
+        # their loads can be gathered at once.
+        town_slots = [i for i, node in enumerate(nodes) if isinstance(node, Town)]
+        self.__power_town_slots = numpy.array(town_slots, dtype=int)
+        self.__power_town_rows = numpy.array([nodes[i].index for i in town_slots], dtype=int)
+
+        self.__power_nodes = nodes
+        self.__power_new_nodes = [node for node in nodes if node not in previous_nodes]
+        self.__power_factorization = self.factorization(len(nodes) - 1, rows, cols, values)
+
+    def __solve_power_network(self):
+        """Solves the voltages for the current loads, using the factorization
+        of the network made by __build_power_network."""
+
+        nodes = self.__power_nodes
+        if not nodes:
+            return
+
+        # Each town consumes current proportional to its size.  This is the
+        # same as Town.current, for all the towns at once.
+        slots = self.__power_town_slots
+        rows = self.__power_town_rows
+        powered = self.town_table.powered[rows]
+        slots = slots[powered]
+        resistance = (230 ** 2) / self.town_table.power[rows[powered]]
+        current = 230 / resistance
+
+        ords = numpy.zeros(len(nodes) - 1)
+        ords[slots - 1] = -current
+        total_current = current.sum()
+        total_conductance = (1.0 / resistance).sum()
+
+        results = numpy.zeros(len(nodes))
+        results[1:] = self.__power_factorization.solve(ords)
+
+        # The voltages so far are relative to the generator.  Shift them so
+        # that all the generators combined produce enough current to satisfy
+        # all the towns.
+        if total_conductance > 0:
+            results += (total_current - (results[slots] / resistance).sum()) / total_conductance
+
+        # Determine the current through each wire based on the voltages.
+        for index in self.wires.set_voltages(results):
+            self.wires.wires[index].on_color_change(self.wires.colors[index])
+
+        self.__power_voltages = results
+
+        # Only the nodes that just joined the network are told about it; the
+        # voltages can be looked up with get_voltages.
+        new_nodes = self.__power_new_nodes
+        self.__power_new_nodes = ()
+        for node in new_nodes:
+            node.on_connected()
+
+        self.on_network_solved()
+
+    def get_voltages(self):
+        """Returns the nodes in the network paired with their voltages, as of
+        the last time it was solved."""
+
+        return zip(self.__power_nodes, self.__power_voltages)
+
+    def find_nodes(self, start):
+        """Returns the set of nodes reachable from the given node via placed
+        wires.  The returned set must not be modified."""
+
+        return self.connectivity.component(start)
+
+    def grow_towns(self, dt):
+        """Grows or shrinks all towns, depending on whether they are powered.
+        Returns the towns whose tiles or category changed."""
+
+        resized, regridded, recategorized = self.town_table.grow(dt)
+        if resized:
+            # They now draw a different amount of power.
+            self.load_version += 1
+
+        towns = self.town_table.towns
+        for index in regridded:
+            towns[index].on_grid_change()
+        for index in recategorized:
+            towns[index].on_category_change()
+
+        changed = set(regridded)
+        changed.update(recategorized)
+        return [towns[index] for index in sorted(changed)]
+
+    def on_network_solved(self):
+        """Called after new voltages have been calculated."""
+        pass
+
+    def step(self, dt):
+        """Runs one iteration of the game logic.  If a new month began during
+        this step, returns its number, which should be passed to begin_month
+        (after any interaction with the player)."""
+
+        self.calc_power(self.gen, dt)
+
+        if dt == 0.0:
+            return None
+
+        self.grow_towns(dt)
+        self.power = self.town_table.total_power()
+
+        energy = self.power * dt * 2
+        self.energy += energy
+        self.total_energy += energy
+        self.upgrade_counter += energy / constants.upgrade_point_rarity
+
+        if self.upgrade_counter > 1:
+            self.upgrade_counter = 0.0
+            self.upgrades += 1
+
+        old_month = self.month
+        self.month += dt * 0.4
+
+        if int(self.month) != int(old_month):
+            return int(self.month)
+
+    def begin_month(self, month):
+        """Applies the rules for the start of the given month.  At the end of
+        a year, returns whether the energy target was met."""
+
+        if month == 6:
+            # Sprout third town.
+            spots = list(self.beginner_town_spots)
+            random.shuffle(spots)
+
+            # If all spots are already occupied, find some other spot.
+            spots.append(None)
+
+            for spot in spots:
+                if spot is not None:
+                    spot = self.center_cell(*spot)
+                if spot is None or self.grid[spot] == 0:
+                    self.sprout_town(grid_pos=spot)
+                    break
+
+        elif month == 12:
+            # We don't actually check energy target here... guess we don't
+            # want to lose the player on the first year.
+            self.energy_target *= constants.energy_target_multiplier
+
+            if self.upgrades == 0:
+                # Aw, here's an upgrade point.
+                self.upgrade_counter = 0.0
+                self.upgrades += 1
+
+            self.sprout_town()
+            return True
+
+        elif month % 12 == 0 and month > 0:
+            self.last_year_energy = self.energy
+            self.energy = 0.0
+
+            if self.last_year_energy >= self.energy_target:
+                self.sprout_town()
+                self.energy_target *= constants.energy_target_multiplier
+                return True
+            else:
+                return False
+
+    def advance(self, dt):
+        """Runs one iteration of the game logic, including the rules for the
+        start of each month.  Use this when running without a player."""
+
+        month = self.step(dt)
+        if month is not None:
+            return self.begin_month(month)
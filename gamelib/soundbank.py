@@ -0,0 +1,62 @@
+from panda3d import core
+
+
+class SoundBank(object):
+    """Plays positional sound effects that are shared by all constructs.  Each
+    sample gets a few voices, and a play takes one that isn't busy.  Plays of
+    the same sample that come in close together are merged into one, and plays
+    beyond the number of voices are dropped.
+
+    The voices aren't attached to objects, so the Audio3DManager doesn't need
+    to update their positions every frame; they are positioned when played.
+    """
+
+    # Plays of the same sample within this many seconds are merged.
+    merge_time = 0.05
+
+    def __init__(self, audio3d):
+        self.audio3d = audio3d
+        self.clock = core.ClockObject.get_global_clock()
+
+        # Maps name to a list of voices, and to the time it was last played.
+        self.voices = {}
+        self.last_played = {}
+
+        # For diagnostics.
+        self.merged_count = 0
+        self.dropped_count = 0
+
+    def load(self, name, filename, volume=1, voices=2):
+        """Loads a sample, with the given number of voices to play it."""
+
+        sounds = []
+        for i in range(voices):
+            sound = self.audio3d.load_sfx(filename)
+            sound.set_volume(volume)
+            sounds.append(sound)
+
+        self.voices[name] = sounds
+        self.last_played[name] = None
+
+    def play(self, name, pos):
+        """Plays the given sample at the given position, unless the same sample
+        was just started or all of its voices are busy.  Returns whether a
+        voice was started."""
+
+        now = self.clock.get_frame_time()
+        last = self.last_played[name]
+        if last is not None and now - last < self.merge_time:
+            self.merged_count += 1
+            return False
+
+        for sound in self.voices[name]:
+            if sound.status() != core.AudioSound.PLAYING:
+                break
+        else:
+            self.dropped_count += 1
+            return False
+
+        self.last_played[name] = now
+        sound.set_3d_attributes(pos[0], pos[1], pos[2], 0, 0, 0)
+        sound.play()
+        return True
@@ -0,0 +1,36 @@
+from panda3d import core
+
+
+# Counts the number of times per frame text geometry is regenerated, which
+# shows up in PStats.  regeneration_count keeps the total, for when PStats
+# isn't running.
+regeneration_collector = core.PStatCollector("Text regenerations")
+regeneration_count = 0
+
+
+def set_text(text_node, text):
+    """Changes the text of a TextNode, but only if it is different from what it
+    shows now, since setting it causes the geometry to be regenerated.
+    Returns whether the text was changed."""
+
+    global regeneration_count
+
+    if text_node.get_wtext() == text:
+        return False
+
+    text_node.set_wtext(text)
+    regeneration_count += 1
+    regeneration_collector.add_level(1)
+    return True
+
+
+def set_onscreen_text(onscreen_text, text):
+    """Like set_text, but for an OnscreenText."""
+
+    return set_text(onscreen_text.textNode, text)
+
+
+def new_frame():
+    """Resets the per-frame counter in PStats.  Call this once per frame."""
+
+    regeneration_collector.set_level(0)
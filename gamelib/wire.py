@@ -1,27 +1,33 @@
 from panda3d import core
 from copy import copy
 import math
+import numpy
 
 from . import constants
+from . import sim
 
 acosh_scale = math.acosh(2) * 2
 
 
-class PowerWire(object):
-    def __init__(self, world, origin, target):
-        self.world = world
-        self.origin = origin
-        self.target = target
+def make_sag_table(segments):
+    """Returns the positions along a wire at which to place its points, and
+    the amount by which the wire sags at each of them, in units of wire_sag.
+    The sag is zero at both ends."""
+
+    t = numpy.linspace(0, 1, segments + 1)
+    sag = numpy.cosh((t - 0.5) * acosh_scale) - 2
+    sag[0] = sag[-1] = 0
+    return t, sag
+
 
-        self.heat = 0
+sag_t, sag_profile = make_sag_table(constants.wire_segments)
 
-        # If placed is false, then self.target does not know about self yet.
-        self.placed = False
 
-        self.path = self.world.root.attach_new_node(core.GeomNode("wires"))
-        self.path.set_light_off(1)
-        self.path.set_color_scale((0.05, 0.05, 0.05, constants.ghost_alpha))
-        #self.path.set_transparency(core.TransparencyAttrib.M_alpha)
+class PowerWire(sim.Wire):
+    def __init__(self, world, origin, target):
+        sim.Wire.__init__(self, world, origin, target)
+
+        self.world.wire_batch.add(self.index, (0.05, 0.05, 0.05, constants.ghost_alpha))
 
         if constants.show_debug_labels:
             debug_label_text = core.TextNode("debug_label")
@@ -38,66 +44,46 @@ class PowerWire(object):
             self.debug_label.set_bin('fixed', 0)
             self.debug_label.node().set_text("0 A")
 
-    def __repr__(self):
-        r = "{!r}--{!r}".format(self.origin, self.target)
-        if self.heat > 0.0:
-            r += " (HOT:{:.1f})".format(self.heat)
-        return r
+    def reset(self, origin, target):
+        sim.Wire.reset(self, origin, target)
 
-    @property
-    def resistance(self):
-        # 1 ohm normally, but 0.2 if target or origin is upgraded.
-        # If target and origin are both pylons, but only one are upgraded, the
-        # effective resistance is only 0.45.
-        if self.target and self.origin:
-            return (1.0 / (self.origin.wire_conductance + self.target.wire_conductance))
-        return 1.0
+        self.world.wire_batch.add(self.index, (0.05, 0.05, 0.05, constants.ghost_alpha))
 
-    def _draw_lines(self):
-        self.path.node().remove_all_geoms()
+        if constants.show_debug_labels:
+            self.debug_label.reparent_to(self.world.root)
+            pos = (self.origin.pos + self.target.pos) * 0.5
+            self.debug_label.set_pos(pos[0], pos[1], 1)
+            self.debug_label.node().set_text("0 A")
 
-        drawer = core.LineSegs()
-        #drawer.set_color((0.05, 0.05, 0.05, 1))
-        drawer.set_thickness(constants.wire_thickness)
+    def _draw_lines(self):
+        batch = self.world.wire_batch
 
         origin_attachments = self.origin.attachments
         target_attachments = self.target.attachments
 
         # Don't cross the lines.
-        if origin_attachments[0].get_quat(self.path).get_forward().dot(target_attachments[0].get_quat(self.path).get_forward()) < 0:
+        if origin_attachments[0].get_quat(batch.path).get_forward().dot(target_attachments[0].get_quat(batch.path).get_forward()) < 0:
             target_attachments = tuple(reversed(target_attachments))
 
         sag = self.origin.allow_wire_sag and self.target.allow_wire_sag
 
-        ti = 0
-        oi = 0
-        tstep = 1
-        ostep = 1
-
         # Step through attachment list more slowly if one has more than the
         # other.
-        if len(origin_attachments) > len(target_attachments):
-            tstep = len(target_attachments) / float(len(origin_attachments))
-        elif len(origin_attachments) < len(target_attachments):
-            ostep = len(origin_attachments) / float(len(target_attachments))
-
-        for i in range(max(len(origin_attachments), len(target_attachments))):
-            from_point = origin_attachments[int(oi)].get_pos(self.path)
-            to_point = target_attachments[int(ti)].get_pos(self.path)
+        num_lines = max(len(origin_attachments), len(target_attachments))
+        steps = numpy.arange(num_lines)
+        oindices = (steps * (len(origin_attachments) / float(num_lines))).astype(int)
+        tindices = (steps * (len(target_attachments) / float(num_lines))).astype(int)
 
-            # Interpolate.
-            drawer.move_to(from_point)
-            for t in (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9):
-                point = from_point * (1 - t) + to_point * t
-                if sag:
-                    point.z += constants.wire_sag * (math.cosh((t - 0.5) * acosh_scale) - 2)
-                drawer.draw_to(point)
-            drawer.draw_to(to_point)
+        from_points = numpy.array([origin_attachments[i].get_pos(batch.path) for i in oindices])
+        to_points = numpy.array([target_attachments[i].get_pos(batch.path) for i in tindices])
 
-            oi += ostep
-            ti += tstep
+        # Interpolate all the points of all lines at once.
+        t = sag_t[None, :, None]
+        points = from_points[:, None, :] * (1 - t) + to_points[:, None, :] * t
+        if sag:
+            points[:, :, 2] += constants.wire_sag * sag_profile
 
-        wires = drawer.create(self.path.node())
+        batch.set_lines(self.index, points)
 
     @property
     def vector(self):
@@ -107,111 +93,40 @@ class PowerWire(object):
     def angle(self):
         return -self.vector.signed_angle_deg((0, 1))
 
-    def try_set_target(self, to):
-        """Try changing the target of the wire, for use during placement."""
-        assert not self.placed
-
-        if to is None:
-            return False
-
-        if to is self.origin:
-            return False
-
-        if not to.placed:
-            return False
-
-        # Already a placed connection here?
-        if to in self.origin.connections and self.origin.connections[to].placed:
-            return False
-
-        if (self.origin.pos - to.pos).length_squared() > (constants.max_pylon_distance + to.selection_distance) ** 2:
-            return False
-
-        self.set_target(to)
-        return True
-
-    def set_target(self, to):
-        """During placement, force connecting to this node."""
-        assert to is not self.origin
-
-        if self.target is not to:
-            del self.target.connections[self.origin]
-            del self.origin.connections[self.target]
-            self.target.on_update()
-
-            self.target = to
-            self.target.connections[self.origin] = self
-            self.origin.connections[self.target] = self
-            self.on_update()
-
-            self.target.on_update()
-            self.origin.on_update()
-
-    def cancel_placement(self):
-        del self.target.connections[self.origin]
-        del self.origin.connections[self.target]
-
-        self.on_update()
-        self.destroy()
-
     def finish_placement(self):
-        assert not self.placed
-        self.placed = True
+        sim.Wire.finish_placement(self)
 
-        print("Finishing placement of {}".format(self))
-        if not self.target.placed:
-            self.target.finish_placement()
-
-        self.path.set_color_scale((0.05, 0.05, 0.05, 1))
+        self.world.wire_batch.set_color(self.index, (0.05, 0.05, 0.05, 1))
+        self.world.wires.forget_color(self.index)
 
     def destroy(self):
-        if self.origin.connections.get(self.target) is self:
-            del self.origin.connections[self.target]
-
-        if self.target.connections.get(self.origin) is self:
-            del self.target.connections[self.origin]
+        sim.Wire.destroy(self)
+        self.world.dirty_wires.pop(self, None)
+        self.world.dirty_lines.pop(self, None)
 
-        self.origin.on_update()
-        self.target.on_update()
-
-        self.path.remove_node()
+        self.world.wire_batch.remove(self.index)
         if constants.show_debug_labels:
-            self.debug_label.remove_node()
-
-    @property
-    def overheated(self):
-        return self.heat >= constants.max_wire_heat
+            self.debug_label.detach_node()
 
-    def on_current_change(self, current, dt):
-        """Called to process an update in current flowing through."""
+    def snap(self):
+        if self.origin:
+            pos = self.origin.root.get_pos(self.world.root)
+            self.world.sounds.play('snap', pos)
 
-        power = current ** 2 * self.resistance
+        sim.Wire.snap(self)
 
-        if constants.show_debug_labels:
-            self.debug_label.node().set_text("{:.1f} W".format(power))
-
-        if power > 2:
-            # Start overheating.
-            self.heat += min((power - 2), 1) * dt
-            self.path.set_color_scale((1, 0, 0, 1))
-            #self.path.set_color_scale((1, 3 - power, 0, 1))
-        elif power > 1:
-            # Cool down.
-            self.heat = max(self.heat - dt, 0)
-            self.path.set_color_scale((1, 2 - power, 2 - power, 1))
-            #self.path.set_color_scale((power - 1, 1, 0, 1))
-        elif power > 0:
-            # Cool down faster.
-            self.heat = max(self.heat - 2 * dt, 0)
-            self.path.set_color_scale((1, 1, 1, 1))
-            #self.path.set_color_scale((0, power, 0, 1))
-        else:
-            self.heat = 0
-            self.path.set_color_scale((0.05, 0.05, 0.05, 1))
+    def on_color_change(self, color):
+        self.world.dirty_wires[self] = color
 
     def on_update(self):
         """Called when position information of neighbours changes."""
 
+        self.world.dirty_lines[self] = None
+
+    def update_lines(self):
+        """Redraws the wire.  Called by the world once per frame if on_update
+        was called."""
+
         #self.path.set_pos(self.origin.x, self.origin.y, 0)
         #self.path.look_at(self.target.x, self.target.y, 0)
         #self.path.set_sy((self.target.root.get_pos() - self.origin.root.get_pos()).length())
@@ -0,0 +1,156 @@
+from panda3d import core
+import numpy
+
+from . import constants
+
+
+# Each wire gets room for this many lines, one per pair of attachments, each
+# made up of this many segments.
+max_lines_per_wire = 6
+segments_per_line = constants.wire_segments
+
+vertices_per_wire = max_lines_per_wire * segments_per_line * 2
+
+
+def make_format():
+    vertex_format = core.GeomVertexFormat()
+    vertex_format.add_array(core.GeomVertexArrayFormat("vertex", 3, core.Geom.NT_float32, core.Geom.C_point))
+    vertex_format.add_array(core.GeomVertexArrayFormat("color", 4, core.Geom.NT_float32, core.Geom.C_color))
+    return core.GeomVertexFormat.register_format(vertex_format)
+
+
+class WireBatch(object):
+    """Draws all wires with a single Geom.  Each wire owns a fixed range of
+    rows in the vertex data, at the same index as in the world's wire table.
+
+    Changes are made to copies of the vertex arrays kept in numpy, and only the
+    rows that changed are copied into the vertex data by flush().
+    """
+
+    def __init__(self, parent, capacity=64):
+        self.vdata = core.GeomVertexData("wires", make_format(), core.Geom.UH_dynamic)
+
+        self.lines = core.GeomLines(core.Geom.UH_dynamic)
+        self.lines.set_index_type(core.Geom.NT_uint32)
+
+        geom = core.Geom(self.vdata)
+        geom.add_primitive(self.lines)
+        node = core.GeomNode("wires")
+        node.add_geom(geom)
+
+        # The wires are all over the map anyway, so don't bother culling.
+        node.set_bounds(core.OmniBoundingVolume())
+        node.set_final(True)
+
+        self.path = parent.attach_new_node(node)
+        self.path.set_light_off(1)
+        self.path.set_render_mode_thickness(constants.wire_thickness)
+
+        # Number of lines drawn for each wire; zero if the slot is free.
+        self.num_lines = numpy.zeros(0, dtype=int)
+        self.points = numpy.zeros((0, 3), dtype=numpy.float32)
+        self.colors = numpy.zeros((0, 4), dtype=numpy.float32)
+
+        # Range of rows that need to be copied into the vertex data.
+        self.dirty_begin = None
+        self.dirty_end = None
+        self.lines_dirty = False
+
+        self.__grow(capacity)
+
+    def __grow(self, capacity):
+        old = len(self.num_lines)
+
+        num_lines = numpy.zeros(capacity, dtype=int)
+        num_lines[:old] = self.num_lines
+        self.num_lines = num_lines
+
+        points = numpy.zeros((capacity * vertices_per_wire, 3), dtype=numpy.float32)
+        points[:len(self.points)] = self.points
+        self.points = points
+
+        colors = numpy.zeros((capacity * vertices_per_wire, 4), dtype=numpy.float32)
+        colors[:len(self.colors)] = self.colors
+        self.colors = colors
+
+        self.vdata.unclean_set_num_rows(capacity * vertices_per_wire)
+        self.__mark_dirty(0, capacity)
+
+    def __mark_dirty(self, begin, end):
+        if self.dirty_begin is None:
+            self.dirty_begin = begin
+            self.dirty_end = end
+        else:
+            self.dirty_begin = min(self.dirty_begin, begin)
+            self.dirty_end = max(self.dirty_end, end)
+
+    def add(self, index, color):
+        """Makes room for the wire with the given index, initially empty."""
+
+        if index >= len(self.num_lines):
+            self.__grow(max(index + 1, len(self.num_lines) * 2))
+
+        self.num_lines[index] = 0
+        self.set_color(index, color)
+        self.lines_dirty = True
+
+    def remove(self, index):
+        self.num_lines[index] = 0
+        self.lines_dirty = True
+
+    def set_lines(self, index, points):
+        """Replaces the lines of the given wire.  Points is an array of shape
+        (lines, segments_per_line + 1, 3) with the points along each line."""
+
+        num_lines = len(points)
+        assert num_lines <= max_lines_per_wire
+
+        begin = index * vertices_per_wire
+        end = begin + num_lines * segments_per_line * 2
+        rows = self.points[begin:end].reshape(num_lines, segments_per_line, 2, 3)
+        rows[:, :, 0] = points[:, :-1]
+        rows[:, :, 1] = points[:, 1:]
+
+        if self.num_lines[index] != num_lines:
+            self.num_lines[index] = num_lines
+            self.lines_dirty = True
+
+        self.__mark_dirty(index, index + 1)
+
+    def set_color(self, index, color):
+        begin = index * vertices_per_wire
+        self.colors[begin:begin + vertices_per_wire] = color
+        self.__mark_dirty(index, index + 1)
+
+    def get_color(self, index):
+        return tuple(float(c) for c in self.colors[index * vertices_per_wire])
+
+    def flush(self):
+        """Copies the changes into the vertex data.  Should be called once per
+        frame."""
+
+        if self.dirty_begin is not None:
+            begin = self.dirty_begin * vertices_per_wire
+            end = self.dirty_end * vertices_per_wire
+            self.dirty_begin = None
+            self.dirty_end = None
+
+            for i, array in enumerate((self.points, self.colors)):
+                view = memoryview(self.vdata.modify_array(i)).cast('B')
+                data = numpy.frombuffer(view, dtype=numpy.float32).reshape(array.shape)
+                data[begin:end] = array[begin:end]
+
+        if self.lines_dirty:
+            self.lines_dirty = False
+
+            # Draw the used rows at the start of each wire's range.
+            counts = self.num_lines * (segments_per_line * 2)
+            starts = numpy.arange(len(counts)) * vertices_per_wire
+            offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+            indices = (numpy.repeat(starts, counts) + offsets).astype(numpy.uint32)
+
+            handle = self.lines.modify_vertices()
+            handle.unclean_set_num_rows(len(indices))
+            if len(indices) > 0:
+                view = memoryview(handle).cast('B')
+                numpy.frombuffer(view, dtype=numpy.uint32)[:] = indices
@@ -1,35 +1,74 @@
 from panda3d import core
 
-from . import constructs, constants
+from . import constructs, constants, textcache
+from .sim import Simulation
+from .wire import PowerWire
+from .wirebatch import WireBatch
+from .soundbank import SoundBank
+from .scenery import Scenery
+from .instancebatch import InstanceBatch
 
-import math
 import numpy
 import random
 
 
-class World(object):
-    beginner_town_spots = [(2, 3), (3, 6), (1, 5), (5, 3), (3, 2)]
+class World(Simulation):
+
+    generator_type = constructs.Generator
+    pylon_type = constructs.Pylon
+    town_type = constructs.Town
+    wire_type = PowerWire
 
     def __init__(self, audio3d):
         self.root = core.NodePath("world")
         self.audio3d = audio3d
 
-        cm = core.CardMaker("card")
-        cm.set_frame(-50, 50, -50, 50)
-        self.plane_model = self.root.attachNewNode(cm.generate())
-        self.plane_model.look_at(0, 0, -1)
-        self.plane_model.set_bin('background', 0)
-        self.plane_model.set_attrib(core.DepthTestAttrib.make(core.RenderAttrib.M_always))
-        self.plane_model.set_depth_write(True)
-
-        mat = core.Material()
-        #mat.diffuse = (218.0/255.0, 234.0/255.0, 182.0/255.0, 1)
-        #mat.diffuse = (181.0/255.0, 214.0/255.0, 111.0/255.0, 1)
-        mat.diffuse = (200.0/255.0, 239.0/255.0, 91.0/255.0, 1)
-        mat.diffuse = mat.diffuse * 1.5
-        #mat.diffuse = (2, 2, 2, 1)
-        mat.ambient = (1, 1, 1, 1)
-        self.plane_model.set_material(mat)
+        # Visual changes are collected while stepping the simulation, and
+        # pushed to the scene graph by flush_visuals.
+        self.dirty_towns = set()
+        self.dirty_wires = {}
+        self.debug_labels_dirty = False
+
+        # Pylons that need to be turned to face their wires, and wires that
+        # need to be redrawn, because something moved.  These are dicts used
+        # as ordered sets, so that each is updated only once per frame.
+        self.dirty_headings = {}
+        self.dirty_lines = {}
+
+        # The power readout of each town's label as last shown, or -1 if the
+        # town was not placed yet and therefore had no label.
+        self.shown_town_power = numpy.zeros(0)
+
+        self.wire_batch = WireBatch(self.root)
+
+        # All pylons of the same kind are drawn at once.
+        self.pylon_batches = {
+            "pylon": InstanceBatch(self.root, loader.load_model("pylon")),
+            "superpylon": InstanceBatch(self.root, loader.load_model("superpylon")),
+        }
+
+        # All the towns share one copy of the city tiles.  They turn their
+        # lights on and off by swapping out the window material.
+        city = loader.load_model("city")
+        self.city_tiles = [
+            tuple(city.find_all_matches("**/tiny.*")),
+            tuple(city.find_all_matches("**/small.*")),
+            tuple(city.find_all_matches("**/medium.*")),
+            tuple(city.find_all_matches("**/large.*")),
+        ]
+        for tiles in self.city_tiles:
+            for tile in tiles:
+                tile.set_pos(0, 0, 0)
+
+        window_mat = city.find_material("window")
+        self.window_lit = core.Material(window_mat)
+        self.window_lit.diffuse = (0.1, 0.1, 0.1, 1)
+        self.window_unlit = core.Material(self.window_lit)
+        self.window_unlit.emission = (0, 0, 0, 1)
+        city.replace_material(window_mat, self.window_unlit)
+
+        # The terrain and everything on it that doesn't change.
+        self.scenery = Scenery(self.root, (constants.grid_size, constants.grid_size))
 
         self.plane = core.Plane(0, 0, 1, 0)
 
@@ -72,121 +111,24 @@ class World(object):
         #self.moon_path.reparent_to(self.root)
         #self.root.set_light(self.moon_path)
 
-        self.towns = []
-        self.pylons = set()
-
-        # Grid prevents building towns at already occupied places.
-        self.grid = numpy.zeros((8, 8), dtype=int)
-
-        # Build one town at a fixed location.
-        self.sprout_town(grid_pos=(5, 4))
-
-        # And two at an arbitrary, close, but not in-view spot.
-        self.sprout_town(grid_pos=random.choice(self.beginner_town_spots), placed=False)
-
-        # Determine coordinates for generator and claim it.
-        x = 3
-        y = 4
-        self.grid[x][y] = 1
-
-        # Oh, also spawn in some shrubberies, and litter them around the map.
-        for i in range(4):
-            self.sprout_shrubbery("trees.egg")
-        for i in range(4):
-            self.sprout_shrubbery("trees2.egg")
-        for i in range(4):
-            self.sprout_shrubbery("trees3.egg")
-        for i in range(4):
-            self.sprout_shrubbery("trees4.egg")
-
-        # Build generator.  Block off everything in the immediate vicinity.
-        self.grid[x+1][y] = 1
-        self.grid[x-1][y] = 1
-        self.grid[x][y-1] = 1
-        self.grid[x+1][y-1] = 1
-        self.grid[x-1][y-1] = 1
-        self.grid[x][y+1] = 1
-        self.grid[x+1][y+1] = 1
-        self.grid[x-1][y+1] = 1
-        x -= self.grid.shape[0] / 2
-        y -= self.grid.shape[1] / 2
-        self.gen = constructs.Generator(self, (x * constants.grid_spacing, y * constants.grid_spacing), "Power Plant")
-        self.gen.placed = True
-
-        # And some impassable terrain.
-        for i in range(3):
-            self.sprout_obstacle("hill.egg")
-        for i in range(3):
-            self.sprout_obstacle("hill2.egg")
-
-        # Draw grid?
-        drawer = core.LineSegs()
-        #drawer.set_color((0.05, 0.05, 0.05, 1))
-        drawer.set_thickness(2)
-
-        min_x = self.grid.shape[0] * -3
-        max_x = self.grid.shape[0] * 3
-        min_y = self.grid.shape[1] * -3
-        max_y = self.grid.shape[1] * 3
-
-        for x in range(min_x, max_x, 3):
-            drawer.move_to((x + 3, min_y, 0.001))
-            drawer.draw_to((x + 3, max_y, 0.001))
-
-        for y in range(min_y, max_y, 3):
-            drawer.move_to((min_x, y + 3, 0.001))
-            drawer.draw_to((max_x, y + 3, 0.001))
-
-        debug_grid = self.root.attach_new_node(drawer.create(False))
-        debug_grid.set_light_off(1)
-        #debug_grid.set_color_scale((0.35, 0.35, 0.35, 1))
-        debug_grid.set_color_scale((192.0/800.0, 239.0/800.0, 91.0/800.0, 1))
-        debug_grid.show()
-        debug_grid.set_depth_write(False)
-        debug_grid.set_bin('background', 10)
-
-        self.snap_sound = self.audio3d.load_sfx('snap.ogg')
-        self.snap_sound.set_volume(64)
-
-    def construct_pylon(self):
-        """Call this to construct additional pylons."""
-
-        pylon = constructs.Pylon(self, (0, 0), "Pylon")
-        self.pylons.add(pylon)
-        return pylon
-
-    def find_free_grid_spot(self):
-        x = random.randint(0, self.grid.shape[0] - 1)
-        y = random.randint(0, self.grid.shape[1] - 1)
-        while self.grid[x][y] != 0:
-            x = random.randint(0, self.grid.shape[0] - 1)
-            y = random.randint(0, self.grid.shape[1] - 1)
-
-        return x, y
-
-    def sprout_town(self, grid_pos=None, placed=True):
-        if grid_pos is not None:
-            x, y = grid_pos
-        else:
-            x, y = self.find_free_grid_spot()
-
-        self.grid[x][y] = 1
-
-        x -= self.grid.shape[0] / 2
-        y -= self.grid.shape[1] / 2
-
-        town = constructs.Town(self, (x * constants.grid_spacing, y * constants.grid_spacing), "City", placed=placed)
-        self.towns.append(town)
+        Simulation.__init__(self)
 
-    def sprout_shrubbery(self, model):
-        x, y = self.find_free_grid_spot()
-        self.grid[x][y] = 1
+        self.scenery.flush()
 
-        x -= self.grid.shape[0] / 2
-        y -= self.grid.shape[1] / 2
+        self.sounds = SoundBank(self.audio3d)
+        self.sounds.load('snap', 'snap.ogg', volume=64)
+        self.sounds.load('drill', 'drill.ogg', volume=14)
+        self.sounds.load('build', 'build.ogg', volume=24)
+        self.sounds.load('pop', 'pop.ogg', volume=8, voices=4)
+        self.sounds.load('shutdown', 'shutdown.ogg', volume=32)
+
+    def sprout_shrubbery(self, model):
+        pos = Simulation.sprout_shrubbery(self, model)
+        if pos is None:
+            return
+        x, y = pos
 
         trees = loader.load_model(model)
-        trees.reparent_to(self.root)
         trees.set_pos((x + (random.random() - 0.5) * 0.75) * constants.grid_spacing,
                       (y + (random.random() - 0.5) * 0.75) * constants.grid_spacing, 0)
         trees.set_h(random.random() * 360)
@@ -195,185 +137,70 @@ class World(object):
         if rock:
             rock.set_color_off(1)
 
-    def sprout_obstacle(self, model):
-        x, y = self.find_free_grid_spot()
-        self.grid[x][y] = 2
+        self.scenery.add_shrubbery(model, trees)
 
-        x -= self.grid.shape[0] / 2
-        y -= self.grid.shape[1] / 2
+    def sprout_obstacle(self, model):
+        pos = Simulation.sprout_obstacle(self, model)
+        if pos is None:
+            return
+        x, y = pos
 
         obstacle = loader.load_model(model)
-        obstacle.reparent_to(self.root)
         obstacle.set_pos((x + (random.random() - 0.5) * 0.25) * constants.grid_spacing,
                          (y + (random.random() - 0.5) * 0.25) * constants.grid_spacing, 0)
         obstacle.set_h(random.random() * 360)
         obstacle.set_sz(random.random() + 0.5)
 
-        if model == "hill.egg":
+        if model == "hill":
             obstacle.set_color((200.0/200.0, 239.0/200.0, 91.0/200.0, 1))
             obstacle.set_sz(random.random() * 0.75 + 0.4)
 
-    def add_town(self, pos, name):
-        town = constructs.Town(self, pos, name, placed=True)
-        self.towns.append(town)
+        self.scenery.add_obstacle(obstacle)
 
-    def is_buildable_terrain(self, x, y):
-        """Returns false if the indicated grid cell is rough terrain."""
+    def on_network_solved(self):
+        self.debug_labels_dirty = constants.show_debug_labels
 
-        x /= constants.grid_spacing
-        y /= constants.grid_spacing
+    def flush_visuals(self):
+        """Applies the visual changes made since the last call, including those
+        resulting from the simulation steps.  Should be called once per frame,
+        before rendering."""
 
-        x += self.grid.shape[0] / 2
-        y += self.grid.shape[1] / 2
+        # Turn the pylons first, since this moves the ends of their wires.
+        for pylon in self.dirty_headings:
+            pylon.update_heading()
+        self.dirty_headings.clear()
 
-        x = int(round(x))
-        y = int(round(y))
+        for wire in self.dirty_lines:
+            wire.update_lines()
+        self.dirty_lines.clear()
 
-        if x < 0 or y < 0 or x >= self.grid.shape[0] or y >= self.grid.shape[1]:
-            # Out of bounds
-            return False
+        for batch in self.pylon_batches.values():
+            batch.flush()
 
-        return self.grid[int(round(x))][int(round(y))] < 2
+        # Check which towns' power readouts changed, all at once.
+        placed = self.town_table.placed[:len(self.town_table)]
+        shown_power = numpy.where(placed, numpy.rint(self.town_table.power * 0.1), -1)
+        count = min(len(shown_power), len(self.shown_town_power))
+        changed = numpy.nonzero(shown_power[:count] != self.shown_town_power[:count])[0]
+        self.dirty_towns.update(self.town_table.towns[index] for index in changed)
+        self.dirty_towns.update(self.town_table.towns[count:])
+        self.shown_town_power = shown_power
 
-    def pick_closest_construct(self, x, y, max_radius=None):
-        """Returns the Construct that falls within the given radius of the given position."""
+        self.scenery.flush()
 
-        closest = None
-        closest_dist_sq = float("inf")
-        if max_radius is not None:
-            closest_dist_sq = max_radius ** 2
+        for town in self.dirty_towns:
+            town.update_visuals()
+        self.dirty_towns.clear()
 
-        for construct in self.towns + [self.gen] + list(self.pylons):
-            if not construct.placed:
-                continue
+        for wire, color in self.dirty_wires.items():
+            self.wire_batch.set_color(wire.index, color)
+        self.dirty_wires.clear()
 
-            dist_sq = (construct.x - x) ** 2 + (construct.y - y) ** 2
-            if dist_sq < closest_dist_sq and dist_sq < (construct.selection_distance ** 2):
-                closest = construct
-                closest_dist_sq = dist_sq
-
-        return closest
-
-    def calc_power(self, start, dt):
-        """Calculates the voltages at each node."""
-
-        # Gather all nodes connected
-        nodes = self.find_nodes(start)
-
-        # Other pylons are disconnected.
-        for node in self.pylons - nodes:
-            node.on_disconnected()
-
-        # So are towns that can't be reached by the generator.
-        for town in self.towns:
-            if town not in nodes:
-                town.on_disconnected()
-
-        # Prune nodes with only one connection, unless they provide or consume
-        # power.
-        discarded = -1
-        while discarded != 0:
-            discarded = 0
-            for node in tuple(nodes):
-                if isinstance(node, constructs.Pylon):
-                    if len(set(node.neighbours) & nodes) < 2:
-                        nodes.discard(node)
-                        node.on_disconnected()
-                        discarded += 1
-
-        if len(nodes) <= 1:
-            for node in nodes:
-                node.on_disconnected()
-            return
+        if self.debug_labels_dirty:
+            self.debug_labels_dirty = False
+            for node, voltage in self.get_voltages():
+                textcache.set_text(node.debug_label.node(), "{:.1f} V".format(voltage))
+            for index in self.wires.active:
+                textcache.set_text(self.wires.wires[index].debug_label.node(), "{:.1f} W".format(self.wires.power[index]))
 
-        # Now create a linear system for Modified Nodal Analysis.
-        nodes = tuple(nodes)
-        matrix = []
-        ords = []
-
-        for i, node in enumerate(nodes):
-            row = [0] * (len(nodes) + 1)
-
-            for node2 in node.neighbours:
-                if node2 in nodes:
-                    j = nodes.index(node2)
-                    conductance = 1 / node.connections[node2].resistance
-                    row[i] += conductance
-                    row[j] += -conductance
-
-            if isinstance(node, constructs.Generator):
-                # Generator current is an unknown.
-                row[-1] = 1
-
-            matrix.append(row)
-
-            if isinstance(node, constructs.Town):
-                # Town: consumes 3A.
-                ords.append(-node.current)
-            else:
-                ords.append(0)
-
-        # Finally, one more equation: all the generators combined produce
-        # enough current to satisfy all the towns.
-        row = [0] * (len(nodes) + 1)
-        row[-1] = 1
-        ords.append(0)
-        for i, node in enumerate(nodes):
-            if isinstance(node, constructs.Town):
-                if node.powered:
-                    row[i] = 1.0 / node.resistance
-                else:
-                    row[i] = 0
-
-        matrix.append(row)
-
-        try:
-            results = numpy.linalg.solve(matrix, ords)
-        except:
-            # Shouldn't happen, but better than nothing?
-            results = numpy.linalg.lstsq(matrix, ords)[0]
-
-        # Determine the current through each wire based on the voltages.
-        hot_wires = []
-        for node, result in zip(nodes, results):
-            for other, wire in list(node.connections.items()):
-                if wire.placed and other in nodes:
-                    # Calc current from voltage differential and resistance.
-                    current = abs(result - results[nodes.index(other)]) / wire.resistance
-                else:
-                    current = 0
-
-                wire.on_current_change(current, dt)
-                if wire.overheated and dt >= 0.0:
-                    hot_wires.append(wire)
-
-            node.on_voltage_change(result)
-
-        # Remove the hottest wire.
-        if hot_wires:
-            hot_wires.sort(key=lambda wire:-wire.heat)
-            print("Removing overheated wire {}".format(hot_wires[0]))
-            if hot_wires[0].origin:
-                pos = hot_wires[0].origin.root.get_pos(self.root)
-                self.snap_sound.set_3d_attributes(pos[0], pos[1], pos[2], 0, 0, 0)
-                self.snap_sound.play()
-            hot_wires[0].destroy()
-
-    def find_nodes(self, start, visited=frozenset()):
-        nodes = set(visited)
-        nodes.add(start)
-
-        for node in start.neighbours:
-            if node not in visited:
-                nodes |= self.find_nodes(node, nodes)
-
-        return nodes
-
-    def step(self, dt):
-        """Runs one iteration of the game logic."""
-
-        self.calc_power(self.gen, dt)
-
-        if dt != 0.0:
-            for town in self.towns:
-                town.grow(dt)
+        self.wire_batch.flush()
@@ -8,6 +8,10 @@ setup(
                 'data/**',
                 'config.prc',
             ],
+            # Ship the models as .bam, and make sure they are found when the
+            # game asks for a model without an extension.
+            'bam_model_extensions': ['.egg'],
+            'extra_prc_data': 'default-model-extension .bam',
             'gui_apps': {
                 'run_game': 'run_game.py',
             },
@@ -0,0 +1,125 @@
+from panda3d import core
+
+import os
+import unittest
+
+from gamelib.instancebatch import InstanceBatch
+
+
+main_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class InstanceBatchTest(unittest.TestCase):
+    """Renders an instance batch offscreen, to check that copies added after
+    it was first drawn aren't culled."""
+
+    size = 64
+
+    @classmethod
+    def setUpClass(cls):
+        core.load_prc_file(core.Filename(core.Filename.from_os_specific(main_dir), "config.prc"))
+
+        # Try the graphics modules in turn, since there may not be a display
+        # to open the default one on.
+        selection = core.GraphicsPipeSelection.get_global_ptr()
+        selection.load_aux_modules()
+
+        cls.engine = core.GraphicsEngine.get_global_ptr()
+        fb_props = core.FrameBufferProperties()
+        fb_props.set_rgb_color(True)
+        fb_props.set_depth_bits(16)
+
+        cls.buffer = None
+        for i in range(selection.get_num_pipe_types()):
+            pipe = selection.make_pipe(selection.get_pipe_type(i))
+            if pipe is None or not pipe.is_valid():
+                continue
+
+            cls.buffer = cls.engine.make_output(pipe, "instancebatch-test", 0, fb_props,
+                                                core.WindowProperties.size(cls.size, cls.size),
+                                                core.GraphicsPipe.BF_refuse_window)
+            if cls.buffer is not None:
+                break
+
+        if cls.buffer is None:
+            raise unittest.SkipTest("unable to open an offscreen buffer")
+
+        cls.buffer.set_clear_color((0, 0, 0, 1))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.remove_window(cls.buffer)
+
+    def setUp(self):
+        self.render = core.NodePath("render")
+        self.render.set_light_off(1)
+
+        # Looking down at the origin, with x to the right.
+        lens = core.OrthographicLens()
+        lens.set_film_size(20, 20)
+        camera = self.render.attach_new_node(core.Camera("camera", lens))
+        camera.set_pos(0, 0, 50)
+        camera.look_at(0, 0, 0)
+
+        self.display_region = self.buffer.make_display_region()
+        self.display_region.set_camera(camera)
+
+        loader = core.Loader.get_global_ptr()
+        self.model = core.NodePath(loader.load_sync("pylon"))
+
+    def tearDown(self):
+        self.buffer.remove_display_region(self.display_region)
+
+    def render_columns(self):
+        """Renders a frame and returns which columns of pixels aren't black."""
+
+        self.engine.render_frame()
+        image = core.PNMImage()
+        self.assertTrue(self.buffer.get_screenshot(image))
+
+        return [any(image.get_bright(x, y) > 0 for y in range(image.get_y_size()))
+                for x in range(image.get_x_size())]
+
+    def add_copy(self, batch, x):
+        node = self.render.attach_new_node("copy")
+        node.set_pos(x, 0, 0)
+        node.set_scale(3)
+        return batch.add(node)
+
+    def test_added_after_first_frame(self):
+        batch = InstanceBatch(self.render, self.model)
+        batch.flush()
+        self.assertFalse(any(self.render_columns()))
+
+        # One on the left, and then one on the right, outside the bounds that
+        # the batch had after the first one was added.
+        self.add_copy(batch, -5)
+        batch.flush()
+        columns = self.render_columns()
+        self.assertTrue(any(columns[:self.size // 2]))
+        self.assertFalse(any(columns[self.size // 2:]))
+
+        self.add_copy(batch, 5)
+        batch.flush()
+        columns = self.render_columns()
+        self.assertTrue(any(columns[:self.size // 2]))
+        self.assertTrue(any(columns[self.size // 2:]))
+
+    def test_translucent_copy(self):
+        batch = InstanceBatch(self.render, self.model)
+        batch.flush()
+        self.render_columns()
+
+        index = self.add_copy(batch, 5)
+        batch.nodes[index].set_alpha_scale(0.5)
+        batch.flush()
+        self.assertTrue(any(self.render_columns()[self.size // 2:]))
+
+        batch.nodes[index].set_alpha_scale(1)
+        batch.update(index)
+        batch.flush()
+        self.assertTrue(any(self.render_columns()[self.size // 2:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
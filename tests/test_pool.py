@@ -0,0 +1,50 @@
+import random
+import unittest
+
+import numpy
+
+from gamelib.sim import Simulation
+
+
+class PoolTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(1)
+        numpy.random.seed(1)
+        self.sim = Simulation()
+
+    def place_pylon(self, origin, x, y):
+        pylon = self.sim.construct_pylon()
+        wire = origin.connect_to(pylon)
+        pylon.position(x, y)
+        pylon.finish_placement()
+        wire.finish_placement()
+        return pylon
+
+    def test_erase_placed_pylon(self):
+        gen = self.sim.gen
+        pylon = self.place_pylon(gen, gen.x + 3, gen.y)
+
+        # Removing its last wire already puts it in the pool, before it is
+        # destroyed itself.
+        pylon.destroy()
+        self.assertEqual(self.sim.pylon_pool, [pylon])
+        self.assertTrue(pylon.pooled)
+
+        self.assertIs(self.sim.construct_pylon(), pylon)
+        self.assertEqual(self.sim.pylon_pool, [])
+        self.assertFalse(pylon.pooled)
+
+    def test_release_ghost_pylon(self):
+        ghost = self.sim.construct_pylon()
+        wire = self.sim.gen.connect_to(ghost)
+        wire.cancel_placement()
+        ghost.on_update()
+
+        self.sim.release_pylon(ghost)
+        self.sim.release_pylon(ghost)
+        self.assertEqual(self.sim.pylon_pool, [ghost])
+
+
+if __name__ == '__main__':
+    unittest.main()
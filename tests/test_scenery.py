@@ -0,0 +1,80 @@
+from panda3d import core
+
+import contextlib
+import io
+import os
+import random
+import unittest
+
+import numpy
+
+from gamelib import constants
+
+
+main_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Enough for everything that is sprouted at the start of the game to end up in
+# a chunk of its own.
+num_scenery_models = 22
+
+
+class SceneryTest(unittest.TestCase):
+    """Checks that setting up the world doesn't take more nodes as the map
+    grows, since most of a big map is empty.  The time it takes is measured by
+    benchmarks.scenery instead."""
+
+    @classmethod
+    def setUpClass(cls):
+        core.load_prc_file(core.Filename(core.Filename.from_os_specific(main_dir), "config.prc"))
+        core.load_prc_file_data("", "window-type none\naudio-library-name null")
+
+        from direct.showbase.ShowBase import ShowBase
+        cls.base = ShowBase()
+
+        # Get the models loaded.
+        cls.make_world(constants.grid_size)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.base.destroy()
+
+    @classmethod
+    def make_world(cls, grid_size):
+        """Returns the number of nodes in the world's scenery and in the whole
+        world, and the number of chunks."""
+
+        from direct.showbase.Audio3DManager import Audio3DManager
+        from gamelib.world import World
+
+        random.seed(0)
+        numpy.random.seed(0)
+
+        default_grid_size = constants.grid_size
+        constants.grid_size = grid_size
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                world = World(Audio3DManager(cls.base.sfxManagerList[0], cls.base.camera))
+        finally:
+            constants.grid_size = default_grid_size
+
+        result = (world.scenery.root.count_num_descendants(),
+                  world.root.count_num_descendants(),
+                  len(world.scenery.chunks))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            world.root.remove_node()
+        return result
+
+    def test_flat_with_grid_size(self):
+        scenery_nodes, world_nodes, chunks = self.make_world(64)
+
+        for grid_size in (256, 1024):
+            big_scenery_nodes, big_world_nodes, big_chunks = self.make_world(grid_size)
+
+            self.assertLessEqual(big_chunks, num_scenery_models)
+            self.assertLessEqual(big_scenery_nodes, scenery_nodes * 1.5)
+            self.assertLessEqual(big_world_nodes, world_nodes * 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import random
+import unittest
+
+import numpy
+
+from gamelib import constants
+from gamelib.sim import Simulation, Scheduler
+
+
+def make_simulation():
+    """Returns a simulation in which every town is connected to the generator
+    by way of a pylon halfway."""
+
+    random.seed(1)
+    numpy.random.seed(1)
+
+    sim = Simulation()
+    for town in sim.towns:
+        town.placed = True
+
+        pylon = sim.construct_pylon()
+        pylon.position((sim.gen.x + town.x) * 0.5, (sim.gen.y + town.y) * 0.5)
+        pylon.finish_placement()
+        sim.gen.connect_to(pylon).finish_placement()
+        pylon.connect_to(town).finish_placement()
+
+    return sim
+
+
+def get_state(sim):
+    return {
+        "month": sim.month,
+        "energy": sim.energy,
+        "upgrades": sim.upgrades,
+        "towns": [(town.pos, town.size, town.powered) for town in sim.towns],
+        "heat": sorted(sim.wires.heat[sim.wires.active].tolist()),
+    }
+
+
+def run(fps, seconds, speed, budget=None):
+    """Runs the simulation for the given number of seconds at the given frame
+    rate and game speed, and returns its state.  With a budget, it is then
+    given as many frames as it needs to catch up."""
+
+    sim = make_simulation()
+    scheduler = Scheduler(sim, budget=budget)
+
+    def on_begin_month(month):
+        sim.begin_month(month)
+        return True
+
+    for i in range(int(round(seconds * fps))):
+        scheduler.update(1.0 / fps, speed, on_begin_month)
+
+    scheduler.budget = None
+    while scheduler.time >= constants.sim_timestep:
+        scheduler.update(0.0, speed, on_begin_month)
+
+    # Add half a step, so that rounding doesn't decide whether the last step
+    # is taken.
+    scheduler.update(constants.sim_timestep * 0.5 / speed, speed, on_begin_month)
+    return get_state(sim)
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def test_frame_rate_independence(self):
+        for speed in 1.0, 3.0, constants.turbo_speed:
+            # Long enough for a year to pass in fast-forward.
+            expected = run(60, 1.0, speed)
+            for fps in 30, 144:
+                self.assertEqual(run(fps, 1.0, speed), expected, "{}x at {} fps".format(speed, fps))
+
+    def test_speed_independence(self):
+        # The same game time in fast-forward as at normal speed.
+        self.assertEqual(run(60, 0.7, constants.turbo_speed), run(60, 0.7 * constants.turbo_speed, 1.0))
+
+    def test_budget(self):
+        # With no time to spare, only one step is taken per frame.  As long
+        # as it falls behind by less than the game time of a hitch, it ends
+        # up in the same state once it has caught up.
+        seconds = constants.sim_max_frame_time * 0.8
+        self.assertEqual(run(60, seconds, 3.0, budget=0.0), run(60, seconds, 3.0))
+
+    def test_backlog_cap(self):
+        sim = make_simulation()
+        scheduler = Scheduler(sim, budget=0.0)
+
+        # Falling further behind than that drops the rest of the time.
+        speed = 3.0
+        for i in range(100):
+            scheduler.update(1.0 / 60, speed, lambda month: True)
+            self.assertLessEqual(scheduler.time, constants.sim_max_frame_time * speed * 0.5)
+
+        self.assertAlmostEqual(sim.month, constants.sim_timestep * 100 * 0.4)
+
+    def test_carry_over(self):
+        sim = make_simulation()
+        scheduler = Scheduler(sim, budget=None)
+
+        # A frame too long to be stepped through at once, but not a hitch.
+        frame_time = constants.sim_timestep * (constants.sim_max_substeps + 4.5) * 2
+        self.assertLess(frame_time, constants.sim_max_frame_time)
+
+        scheduler.update(frame_time, 1.0, lambda month: True)
+        self.assertAlmostEqual(sim.month, constants.sim_timestep * constants.sim_max_substeps * 0.4)
+
+        # The rest is made up for in the next frame.
+        scheduler.update(0.0, 1.0, lambda month: True)
+        self.assertAlmostEqual(sim.month, constants.sim_timestep * (constants.sim_max_substeps + 4) * 0.4)
+
+
+if __name__ == '__main__':
+    unittest.main()